@@ -4,14 +4,30 @@ from datetime import datetime, date, timedelta
 import uuid
 import json
 import mimetypes
-from flask import Flask, render_template, redirect, url_for, flash, request, session, jsonify, send_from_directory, abort
+import threading
+from flask import Flask, Response, g, render_template, redirect, url_for, flash, request, session, jsonify, send_from_directory, abort
 from sqlalchemy import or_, and_
 from flask_wtf.csrf import CSRFProtect
 from forms import LoginForm, RegisterForm
-from models import db, User, Task, TaskAttachment, Mail, Role, ChatMessage, ChatReadState, ProjectNode, ProjectNodeAssignee
+from db_config import configure_database, use_read_replica
+from migrations import current_version, latest_version, upgrade
+from models import db, User, Task, TaskAttachment, Mail, Role, ChatMessage, ChatMessageArchive, ChatReadState, ProjectNode, ProjectNodeAssignee
 from werkzeug.utils import secure_filename
 from authlib.integrations.flask_client import OAuth
-from notification_service import notify_user_channels
+from notification_outbox import enqueue_bulk_notification, enqueue_user_notification, start_outbox_worker
+from notification_service import provider_metrics
+from mail_retention import start_trash_sweeper
+from chat_archive import start_chat_archiver
+from file_reclaim import start_file_reclaimer
+import chat_receipts
+import project_tree
+import task_feed
+import task_stats
+import unread_counters
+import user_cache
+import user_deletion
+import user_directory
+from event_hub import chat_signal, hub
 
 
 # Single application instance and configuration
@@ -19,14 +35,46 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-change-me')
 app.secret_key = app.config['SECRET_KEY']
 
-# Configure SQLite database
+# Configure SQLite database (WAL, busy timeout and pool tuning applied by db_config)
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'creatia.db')
+configure_database(app, 'sqlite:///' + os.path.join(basedir, 'creatia.db'))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = os.path.join(basedir, 'uploads')
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 # Extend or disable CSRF token expiry to avoid "token expired" on logins
 app.config['WTF_CSRF_TIME_LIMIT'] = None
+# Apply pending migrations at startup (single-process/dev only; use migrate.py for deployments)
+app.config['AUTO_MIGRATE'] = os.environ.get('AUTO_MIGRATE', '0') == '1'
+# Trash retention: mails in trash longer than this are purged by the background sweeper
+app.config['MAIL_RETENTION_DAYS'] = int(os.environ.get('MAIL_RETENTION_DAYS', 20))
+app.config['MAIL_RETENTION_BATCH_SIZE'] = int(os.environ.get('MAIL_RETENTION_BATCH_SIZE', 500))
+app.config['MAIL_RETENTION_SWEEP_SECONDS'] = float(os.environ.get('MAIL_RETENTION_SWEEP_SECONDS', 3600))
+# Chat archive: messages older than this move from chat_messages to chat_messages_archive
+app.config['CHAT_ARCHIVE_DAYS'] = int(os.environ.get('CHAT_ARCHIVE_DAYS', 90))
+app.config['CHAT_ARCHIVE_BATCH_SIZE'] = int(os.environ.get('CHAT_ARCHIVE_BATCH_SIZE', 500))
+app.config['CHAT_ARCHIVE_SWEEP_SECONDS'] = float(os.environ.get('CHAT_ARCHIVE_SWEEP_SECONDS', 3600))
+# Orphaned upload files queued by deletions are unlinked by the background file reclaimer
+app.config['FILE_RECLAIM_POLL_SECONDS'] = float(os.environ.get('FILE_RECLAIM_POLL_SECONDS', 300))
+app.config['FILE_RECLAIM_BATCH_SIZE'] = int(os.environ.get('FILE_RECLAIM_BATCH_SIZE', 100))
+app.config['FILE_RECLAIM_MAX_ATTEMPTS'] = int(os.environ.get('FILE_RECLAIM_MAX_ATTEMPTS', 5))
+# Notification outbox dispatcher (0 workers disables it, e.g. when a separate process dispatches)
+app.config['NOTIFY_OUTBOX_WORKERS'] = int(os.environ.get('NOTIFY_OUTBOX_WORKERS', 8))
+app.config['NOTIFY_OUTBOX_BATCH_SIZE'] = int(os.environ.get('NOTIFY_OUTBOX_BATCH_SIZE', 50))
+app.config['NOTIFY_OUTBOX_POLL_SECONDS'] = float(os.environ.get('NOTIFY_OUTBOX_POLL_SECONDS', 2))
+app.config['NOTIFY_OUTBOX_MAX_ATTEMPTS'] = int(os.environ.get('NOTIFY_OUTBOX_MAX_ATTEMPTS', 5))
+app.config['NOTIFY_OUTBOX_BACKOFF_SECONDS'] = float(os.environ.get('NOTIFY_OUTBOX_BACKOFF_SECONDS', 30))
+# Seconds between SSE keepalive comments on /api/events
+app.config['EVENTS_KEEPALIVE_SECONDS'] = float(os.environ.get('EVENTS_KEEPALIVE_SECONDS', 25))
+# Max age of the cached /api/project-tree snapshot; bounds staleness after edits made by other processes
+app.config['PROJECT_TREE_CACHE_SECONDS'] = float(os.environ.get('PROJECT_TREE_CACHE_SECONDS', 60))
+# Seconds cached user rows (current_user()) and the user directory are served without a query;
+# bounds staleness after writes made by other processes
+app.config['USER_CACHE_SECONDS'] = float(os.environ.get('USER_CACHE_SECONDS', 30))
+# Serve dashboard/profile task stats from the rolling task_stats table instead of aggregating tasks
+app.config['TASK_STATS_ROLLING'] = os.environ.get('TASK_STATS_ROLLING', '0') == '1'
+app.config['TASK_STATS_MAX_AGE_SECONDS'] = float(os.environ.get('TASK_STATS_MAX_AGE_SECONDS', 3600))
+# Upper bound for ?wait= on /api/chat/messages long-polls (each waiting poll holds a worker thread)
+app.config['CHAT_LONG_POLL_SECONDS'] = float(os.environ.get('CHAT_LONG_POLL_SECONDS', 25))
 
 # Initialize database and CSRF protection
 db.init_app(app)
@@ -50,180 +98,188 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-# Create database tables and ensure schema compatibility
+# Schema is managed by versioned migrations (python migrate.py); startup only checks the version
 with app.app_context():
-    db.create_all()
-    # Ensure newer columns exist when running on an older SQLite file (lightweight migration)
-    try:
-        result_users = db.session.execute(db.text("PRAGMA table_info(users)")).fetchall()
-        user_cols = {row[1] for row in result_users}
-        if "full_name" not in user_cols:
-            db.session.execute(db.text("ALTER TABLE users ADD COLUMN full_name TEXT"))
-        if "education" not in user_cols:
-            db.session.execute(db.text("ALTER TABLE users ADD COLUMN education TEXT"))
-        if "resume_path" not in user_cols:
-            db.session.execute(db.text("ALTER TABLE users ADD COLUMN resume_path TEXT"))
-        if "avatar_path" not in user_cols:
-            db.session.execute(db.text("ALTER TABLE users ADD COLUMN avatar_path TEXT"))
-        if "avatar_scale" not in user_cols:
-            db.session.execute(db.text("ALTER TABLE users ADD COLUMN avatar_scale REAL DEFAULT 1.0"))
-        if "avatar_offset_x" not in user_cols:
-            db.session.execute(db.text("ALTER TABLE users ADD COLUMN avatar_offset_x REAL DEFAULT 0.0"))
-        if "avatar_offset_y" not in user_cols:
-            db.session.execute(db.text("ALTER TABLE users ADD COLUMN avatar_offset_y REAL DEFAULT 0.0"))
-        if "responsibility" not in user_cols:
-            db.session.execute(db.text("ALTER TABLE users ADD COLUMN responsibility TEXT"))
-        if "profile_files" not in user_cols:
-            db.session.execute(db.text("ALTER TABLE users ADD COLUMN profile_files TEXT"))
-        if "phone_number" not in user_cols:
-            db.session.execute(db.text("ALTER TABLE users ADD COLUMN phone_number TEXT"))
-
-        result = db.session.execute(db.text("PRAGMA table_info(tasks)")).fetchall()
-        cols = {row[1] for row in result}
-        if "description" not in cols:
-            db.session.execute(db.text("ALTER TABLE tasks ADD COLUMN description TEXT"))
-        if "view_status" not in cols:
-            db.session.execute(db.text("ALTER TABLE tasks ADD COLUMN view_status TEXT DEFAULT 'send'"))
-        if "viewed_at" not in cols:
-            db.session.execute(db.text("ALTER TABLE tasks ADD COLUMN viewed_at DATETIME"))
-        if "approved_at" not in cols:
-            db.session.execute(db.text("ALTER TABLE tasks ADD COLUMN approved_at DATETIME"))
-        if "recurrence_type" not in cols:
-            db.session.execute(db.text("ALTER TABLE tasks ADD COLUMN recurrence_type TEXT DEFAULT 'one_time'"))
-        if "recurrence_group_id" not in cols:
-            db.session.execute(db.text("ALTER TABLE tasks ADD COLUMN recurrence_group_id TEXT"))
-        if "submitted_at" not in cols:
-            db.session.execute(db.text("ALTER TABLE tasks ADD COLUMN submitted_at DATETIME"))
-        # Mail table migrations
-        result_mail = db.session.execute(db.text("PRAGMA table_info(mails)")).fetchall()
-        mail_cols = {row[1] for row in result_mail}
-        if "is_draft" not in mail_cols:
-            db.session.execute(db.text("ALTER TABLE mails ADD COLUMN is_draft BOOLEAN DEFAULT 0"))
-        if "deleted_at" not in mail_cols:
-            db.session.execute(db.text("ALTER TABLE mails ADD COLUMN deleted_at DATETIME"))
-        if "is_saved" not in mail_cols:
-            db.session.execute(db.text("ALTER TABLE mails ADD COLUMN is_saved BOOLEAN DEFAULT 0"))
-        # Project tree tables
-        result_nodes = db.session.execute(db.text("PRAGMA table_info(project_nodes)")).fetchall()
-        node_cols = {row[1] for row in result_nodes}
-        if not result_nodes:
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS project_nodes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    parent_id INTEGER REFERENCES project_nodes(id),
-                    researcher_id INTEGER REFERENCES users(id),
-                    created_at DATETIME,
-                    updated_at DATETIME
-                )
-            """))
+    schema_version = current_version()
+    if schema_version < latest_version():
+        if app.config['AUTO_MIGRATE']:
+            upgrade()
         else:
-            if "researcher_id" not in node_cols:
-                db.session.execute(db.text("ALTER TABLE project_nodes ADD COLUMN researcher_id INTEGER REFERENCES users(id)"))
-        result_node_assignees = db.session.execute(db.text("PRAGMA table_info(project_node_assignees)")).fetchall()
-        if not result_node_assignees:
-            db.session.execute(db.text("""
-                CREATE TABLE IF NOT EXISTS project_node_assignees (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    node_id INTEGER NOT NULL REFERENCES project_nodes(id),
-                    user_id INTEGER NOT NULL REFERENCES users(id),
-                    created_at DATETIME,
-                    CONSTRAINT uq_node_user UNIQUE (node_id, user_id)
-                )
-            """))
-        result_roles = db.session.execute(db.text("PRAGMA table_info(roles)")).fetchall()
-        if not result_roles:
-            db.session.execute(db.text("CREATE TABLE IF NOT EXISTS roles (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE, permissions TEXT)"))
-        # Chat tables (create if missing)
-        db.create_all()
-        db.session.commit()
-    except Exception:
-        logger.exception("Schema check failed while ensuring tasks table columns")
+            logger.warning(
+                "Database schema is at version %s but %s is available; run `python migrate.py`.",
+                schema_version,
+                latest_version(),
+            )
 
 
 def current_user():
+    # Memoized per request, and served from the process-wide user cache across requests
     uid = session.get('user_id')
     if not uid:
         return None
-    return User.query.get(uid)
+    cached = g.get('current_user')
+    if cached is None or cached[0] != uid:
+        cached = g.current_user = (uid, user_cache.get_user(uid, app.config['USER_CACHE_SECONDS']))
+    return cached[1]
+
+
+def user_changed(user_id):
+    """Drop cached data derived from a user row; call after committing a write to it."""
+    user_cache.invalidate(user_id)
+    user_directory.invalidate()
+    project_tree.invalidate()
+
+
+_trash_sweeper = None
+_outbox_worker = None
+_chat_archiver = None
+_file_reclaimer = None
+_background_lock = threading.Lock()
+
+
+@app.before_request
+def ensure_background_workers():
+    # Started lazily so CLI scripts importing the app do not spawn background threads
+    global _trash_sweeper, _outbox_worker, _chat_archiver, _file_reclaimer
+    if _trash_sweeper is not None:
+        return
+    with _background_lock:
+        if _trash_sweeper is None:
+            _outbox_worker = start_outbox_worker(app)
+            _chat_archiver = start_chat_archiver(app)
+            _file_reclaimer = start_file_reclaimer(app)
+            _trash_sweeper = start_trash_sweeper(app) or False
+
+
+def wake_outbox():
+    if _outbox_worker:
+        _outbox_worker.wake()
+
+
+def wake_file_reclaimer():
+    if _file_reclaimer:
+        _file_reclaimer.wake()
 
 
 def unread_mail_count(user_id):
-    now = datetime.utcnow()
-    # purge trash older than 20 days
-    threshold = now - timedelta(days=20)
-    Mail.query.filter(Mail.deleted_at.isnot(None), Mail.deleted_at < threshold).delete()
-    db.session.commit()
-    return Mail.query.filter_by(recipient_id=user_id, is_read=False, deleted_at=None, is_draft=False).count()
+    # Read-only: trash retention is handled by mail_retention's background sweeper
+    return unread_counters.mail_unread(user_id)
 
 
-ROLE_DISPLAY_ORDER = {'admin': 0, 'supervisor': 1, 'researcher': 2}
+def users_directory():
+    """Cached, pre-sorted snapshot of all users (see user_directory)."""
+    return user_directory.snapshot(app.config['USER_CACHE_SECONDS'])
 
 
 def ordered_users_for_cards():
     """Return users sorted by role priority then name for UI cards."""
-    users = User.query.order_by(User.username).all()
-    def sort_key(u):
-        name = (u.full_name or u.username or u.email or '').lower()
-        return (ROLE_DISPLAY_ORDER.get(u.role, len(ROLE_DISPLAY_ORDER)), name)
-    return sorted(users, key=sort_key)
+    return users_directory().cards
+
+
+def task_stats_for(user_ids):
+    return task_stats.stats_for(
+        user_ids,
+        rolling=app.config['TASK_STATS_ROLLING'],
+        max_age=timedelta(seconds=app.config['TASK_STATS_MAX_AGE_SECONDS']),
+    )
 
 
 def user_task_stats_map(users):
     """Compute lightweight task stats for a set of users (for cards)."""
-    ids = [u.id for u in users if u and u.id]
-    stats = {uid: {'assigned': 0, 'completed': 0, 'overdue': 0, 'on_time_pct': 0.0} for uid in ids}
-    if not ids:
-        return stats
-    today = date.today()
-    tasks = Task.query.filter(Task.assigned_to_id.in_(ids)).all()
-    for task in tasks:
-        s = stats.get(task.assigned_to_id)
-        if s is None:
-            continue
-        s['assigned'] += 1
-        if task.status == 'done':
-            s['completed'] += 1
-        elif task.due_date and task.due_date < today:
-            s['overdue'] += 1
-    for uid, s in stats.items():
-        denom = s['completed'] + s['overdue']
-        pct = (s['completed'] / denom) * 100 if denom else 0
-        s['on_time_pct'] = round(max(0, min(100, pct)), 1)
-    return stats
+    counts = task_stats_for(u.id for u in users if u and u.id)
+    return {uid: c.to_dict() for uid, c in counts.items()}
 
 
 def send_mail(subject, body, recipient_id, sender_id=None):
     msg = Mail(subject=subject, body=body, recipient_id=recipient_id, sender_id=sender_id, is_draft=False)
     db.session.add(msg)
+    unread_counters.bump_mail(recipient_id)
     db.session.commit()
+    publish_mail_event(msg)
     return msg
 
 
-def notify_task_assignment(task, assigner):
-    """Send email + SMS when a task is assigned."""
-    assignee = task.assigned_to
-    if not assignee:
+def publish_mail_event(mail):
+    """Push a mail arrival to the recipient's open event streams."""
+    hub.publish(
+        'mail',
+        {'id': mail.id, 'subject': mail.subject, 'sender_id': mail.sender_id},
+        user_ids=[mail.recipient_id],
+    )
+
+
+def publish_unread_event(user_ids, channel):
+    hub.publish('unread', {'channel': channel}, user_ids=user_ids)
+
+
+def publish_chat_event(msg, deleted=False):
+    if deleted:
+        data = {'id': msg.id, 'sender_id': msg.sender_id, 'recipient_id': msg.recipient_id}
+    else:
+        data = msg.to_dict()
+        chat_signal.advance(conversation_key(msg.sender_id, msg.recipient_id), msg.id)
+    data['deleted'] = deleted
+    audience = None if msg.recipient_id is None else [msg.sender_id, msg.recipient_id]
+    hub.publish('chat', data, user_ids=audience)
+
+
+def publish_task_event(tasks, action):
+    """Notify assignees, creators and admins that tasks changed."""
+    tasks = tasks if isinstance(tasks, (list, tuple)) else [tasks]
+    audience = set()
+    for t in tasks:
+        audience.add(t.assigned_to_id)
+        if t.created_by_id:
+            audience.add(t.created_by_id)
+    hub.publish('task', {'ids': [t.id for t in tasks], 'action': action}, user_ids=audience, roles=['admin'])
+
+
+def notify_task_assignments(tasks, assigner):
+    """
+    Queue email + SMS for newly assigned tasks (committed with the caller's transaction).
+
+    Tasks created together share one template, so a bulk assignment becomes a few
+    batched provider calls instead of one email per assignee.
+    """
+    tasks = [t for t in tasks if t.assigned_to]
+    if not tasks:
         return
+    task = tasks[0]
     assigner_name = (assigner.full_name or assigner.username) if assigner else "System"
     due_text = task.due_date.isoformat() if task.due_date else "unspecified due date"
-    dash_route = 'admin_dashboard' if assignee.role == 'admin' else ('supervisor_dashboard' if assignee.role == 'supervisor' else 'researcher_dashboard')
-    dashboard_url = url_for(dash_route, _external=True)
     description = (task.description or "").strip() or "No description provided."
-    email_body = (
-        f"Hi {assignee.full_name or assignee.username},\n\n"
+    email_template = (
+        "Hi -name-,\n\n"
         f"{assigner_name} assigned you a new task.\n"
         f"Title: {task.title}\n"
         f"Due: {due_text}\n"
         f"Details: {description}\n\n"
-        f"Open your dashboard: {dashboard_url}"
+        "Open your dashboard: -dashboard_url-"
     )
     sms_body = f"New task from {assigner_name}: {task.title} (due {due_text})"
-    notify_user_channels(assignee, f"New task: {task.title}", email_body, sms_body, sender_name=assigner_name)
+    dashboard_urls = {}
+
+    def substitutions(assignee):
+        dash_route = 'admin_dashboard' if assignee.role == 'admin' else ('supervisor_dashboard' if assignee.role == 'supervisor' else 'researcher_dashboard')
+        if dash_route not in dashboard_urls:
+            dashboard_urls[dash_route] = url_for(dash_route, _external=True)
+        return {
+            '-name-': assignee.full_name or assignee.username,
+            '-dashboard_url-': dashboard_urls[dash_route],
+        }
+
+    enqueue_bulk_notification(
+        [t.assigned_to for t in tasks],
+        f"New task: {task.title}",
+        email_template,
+        sms_body,
+        substitutions,
+        sender_name=assigner_name,
+    )
 
 
 def notify_mail_received(mail):
-    """Send email + SMS when a mailbox message arrives."""
+    """Queue email + SMS when a mailbox message arrives (committed with the caller's transaction)."""
     if not mail or mail.is_draft:
         return
     recipient = mail.recipient
@@ -238,7 +294,7 @@ def notify_mail_received(mail):
         f"Read it here: {inbox_url}"
     )
     sms_body = f"New inbox message from {sender_name}: {mail.subject}"
-    notify_user_channels(recipient, f"New message from {sender_name}", email_body, sms_body, sender_name=sender_name)
+    enqueue_user_notification(recipient, f"New message from {sender_name}", email_body, sms_body, sender_name=sender_name)
 
 
 def next_recurrence_date(cur_date, rtype):
@@ -295,6 +351,7 @@ def login():
             else:
                 # Update last login and set session
                 user.update_last_login()
+                user_cache.invalidate(user.id)
                 session['user_id'] = user.id
                 session['username'] = user.username
                 session['role'] = user.role
@@ -355,9 +412,11 @@ def auth_google():
         user.set_password(os.urandom(16).hex())
         db.session.add(user)
         db.session.commit()
+        user_directory.invalidate()
 
     # finalize login
     user.update_last_login()
+    user_cache.invalidate(user.id)
     session['user_id'] = user.id
     session['username'] = user.username
     session['role'] = user.role
@@ -386,6 +445,7 @@ def register():
                 user.set_password(password)
                 db.session.add(user)
                 db.session.commit()
+                user_directory.invalidate()
 
                 flash('Account created successfully! Please log in.', 'success')
                 return redirect(url_for('login'))
@@ -403,18 +463,11 @@ def admin_dashboard():
     if not session.get('user_id') or session.get('role') != 'admin':
         return redirect(url_for('login'))
 
-    user = User.query.get(session.get('user_id'))
-    all_users = ordered_users_for_cards()
+    user = current_user()
+    directory = users_directory()
+    all_users = directory.cards
     user_stats = user_task_stats_map(all_users)
-    assignee_list = [
-        {
-            'id': u.id,
-            'username': u.username,
-            'full_name': u.full_name,
-            'role': u.role,
-        }
-        for u in all_users
-    ]
+    assignee_list = list(directory.assignees)
     return render_template(
         'admin_dashboard.html',
         user=user,
@@ -431,7 +484,7 @@ def researcher_dashboard():
     if not session.get('user_id'):
         return redirect(url_for('login'))
 
-    user = User.query.get(session.get('user_id'))
+    user = current_user()
     if not user or not user.is_active:
         session.clear()
         return redirect(url_for('login'))
@@ -452,7 +505,7 @@ def supervisor_dashboard():
     if not session.get('user_id') or session.get('role') != 'supervisor':
         return redirect(url_for('login'))
 
-    user = User.query.get(session.get('user_id'))
+    user = current_user()
     if not user or not user.is_active:
         session.clear()
         return redirect(url_for('login'))
@@ -587,29 +640,21 @@ def profile():
                 user.set_password(password)
             if not error:
                 db.session.commit()
+                user_changed(user.id)
                 flash("Profile updated.", "success")
                 return redirect(url_for('profile'))
-    tasks_q = Task.query.filter_by(assigned_to_id=user.id).all()
-    assigned_count = len(tasks_q)
-    completed_tasks = [t for t in tasks_q if t.status == 'done']
-    overdue_tasks = [t for t in tasks_q if t.status != 'done' and t.due_date and t.due_date < date.today()]
-    completed_count = len(completed_tasks)
-    overdue_count = len(overdue_tasks)
-    total_finished_or_due = completed_count + overdue_count
-    on_time_pct = round((completed_count / total_finished_or_due) * 100, 1) if total_finished_or_due else 0
-    completion_pct = round((completed_count / assigned_count) * 100, 1) if assigned_count else 0
-    overdue_pct = round((overdue_count / assigned_count) * 100, 1) if assigned_count else 0
+    stats = task_stats_for([user.id])[user.id]
     return render_template(
         'profile.html',
         user=user,
         unread_mails=unread_mail_count(user.id),
         error=error,
-        assigned_count=assigned_count,
-        completed_count=completed_count,
-        overdue_count=overdue_count,
-        on_time_pct=on_time_pct,
-        completion_pct=completion_pct,
-        overdue_pct=overdue_pct,
+        assigned_count=stats.assigned,
+        completed_count=stats.completed,
+        overdue_count=stats.overdue,
+        on_time_pct=stats.on_time_pct,
+        completion_pct=stats.completion_pct,
+        overdue_pct=stats.overdue_pct,
         profile_files=profile_files,
         profile_file_labels=profile_file_labels,
     )
@@ -618,14 +663,14 @@ def profile():
 @app.route('/mails')
 def mails():
     user = require_login()
-    users = User.query.order_by(User.username).all()
+    users = users_directory().by_username
     return render_template('mails.html', user=user, unread_mails=unread_mail_count(user.id), users=users)
 
 
 @app.route('/chat')
 def chat():
     user = require_login()
-    users = User.query.filter(User.id != user.id).order_by(User.username).all()
+    users = users_directory().others(user.id)
     return render_template(
         'chat.html',
         user=user,
@@ -634,6 +679,58 @@ def chat():
     )
 
 
+def conversation_filter(user_id, peer_id, model=ChatMessage):
+    """Filter for the group conversation (peer_id None) or a private conversation."""
+    if peer_id is None:
+        return model.recipient_id.is_(None)
+    return or_(
+        and_(model.sender_id == user_id, model.recipient_id == peer_id),
+        and_(model.sender_id == peer_id, model.recipient_id == user_id),
+    )
+
+
+CHAT_PAGE_SIZE = 200
+
+
+def chat_history_before(user_id, peer_id, before_id, limit=CHAT_PAGE_SIZE):
+    """
+    Up to ``limit`` messages older than ``before_id`` (newest page when None), oldest first.
+    Reads the hot table and continues into the archive when the hot window runs out.
+    """
+    hot = ChatMessage.query.filter(conversation_filter(user_id, peer_id))
+    if before_id:
+        hot = hot.filter(ChatMessage.id < before_id)
+    page = hot.order_by(ChatMessage.id.desc()).limit(limit).all()
+    if len(page) < limit:
+        cold = ChatMessageArchive.query.filter(conversation_filter(user_id, peer_id, ChatMessageArchive))
+        lower = page[-1].id if page else before_id
+        if lower:
+            cold = cold.filter(ChatMessageArchive.id < lower)
+        page += cold.order_by(ChatMessageArchive.id.desc()).limit(limit - len(page)).all()
+    page.reverse()
+    return page
+
+
+def conversation_key(user_id, peer_id):
+    """Process-local key for a conversation, the same from either participant's side."""
+    if peer_id is None:
+        return 'group'
+    return (min(user_id, peer_id), max(user_id, peer_id))
+
+
+def wait_for_chat_message(user_id, peer_id, after_id, timeout):
+    """Long-poll: block until the conversation has a message newer than after_id, or timeout."""
+    key = conversation_key(user_id, peer_id)
+    if chat_signal.latest(key) is None:
+        newest = db.session.query(db.func.max(ChatMessage.id)).filter(conversation_filter(user_id, peer_id)).scalar()
+        chat_signal.advance(key, newest or 0)
+    if chat_signal.latest(key) > after_id:
+        return True
+    # Hand the pooled connection back while the request sleeps
+    db.session.close()
+    return chat_signal.wait_for(key, after_id, timeout)
+
+
 @csrf.exempt
 @app.route('/api/chat/messages', methods=['GET', 'POST'])
 def api_chat_messages():
@@ -641,28 +738,37 @@ def api_chat_messages():
     if request.method == 'GET':
         target_raw = request.args.get('target', 'group')
         after_id = request.args.get('after', type=int)
+        before_id = request.args.get('before', type=int)
         mark_read = request.args.get('mark_read', '1') == '1'
-        q = ChatMessage.query
+        if not mark_read or before_id:
+            # Marking read checks the cursor before writing it; that read must not see a lagging replica
+            use_read_replica(db.session)
         if target_raw == 'group':
-            q = q.filter(ChatMessage.recipient_id.is_(None))
+            target_id = None
         else:
             try:
                 target_id = int(target_raw)
             except (TypeError, ValueError):
                 return jsonify({'error': 'Invalid target.'}), 400
-            q = q.filter(
-                or_(
-                    and_(ChatMessage.sender_id == user.id, ChatMessage.recipient_id == target_id),
-                    and_(ChatMessage.sender_id == target_id, ChatMessage.recipient_id == user.id),
-                )
-            )
+        wait = min(max(request.args.get('wait', 0, type=float), 0), app.config['CHAT_LONG_POLL_SECONDS'])
+        if after_id is not None and wait:
+            wait_for_chat_message(user.id, target_id, after_id, wait)
         if after_id:
-            q = q.filter(ChatMessage.id > after_id)
-        msgs = q.order_by(ChatMessage.id.asc()).limit(200).all()
-        if mark_read and msgs:
-            last_id = msgs[-1].id
-            _set_last_read(user.id, None if target_raw == 'group' else int(target_raw), last_id)
-        return jsonify([m.to_dict(user.id, can_delete=_can_delete_message(user, m)) for m in msgs])
+            msgs = (
+                ChatMessage.query.filter(conversation_filter(user.id, target_id), ChatMessage.id > after_id)
+                .order_by(ChatMessage.id.asc())
+                .limit(CHAT_PAGE_SIZE)
+                .all()
+            )
+        else:
+            msgs = chat_history_before(user.id, target_id, before_id)
+        # Serialize before _set_last_read commits, so the rows are not reloaded after expiry
+        payload = [
+            m.to_dict(user.id, can_delete=isinstance(m, ChatMessage) and _can_delete_message(user, m)) for m in msgs
+        ]
+        if mark_read and msgs and not before_id:
+            _set_last_read(user.id, target_id, msgs[-1].id)
+        return jsonify(payload)
 
     # POST
     data = request.get_json() or {}
@@ -679,23 +785,32 @@ def api_chat_messages():
             return jsonify({'error': 'Invalid recipient.'}), 400
         if recipient_id == user.id:
             return jsonify({'error': 'Cannot send a private message to yourself.'}), 400
-        if not User.query.get(recipient_id):
+        if not user_cache.get_user(recipient_id, app.config['USER_CACHE_SECONDS']):
             return jsonify({'error': 'Recipient not found.'}), 404
 
     msg = ChatMessage(sender_id=user.id, recipient_id=recipient_id, body=body)
     db.session.add(msg)
+    unread_counters.chat_message_added(msg)
     db.session.commit()
+    publish_chat_event(msg)
     return jsonify(msg.to_dict(user.id, can_delete=_can_delete_message(user, msg))), 201
 
 
 def _set_last_read(user_id, peer_id, last_id):
+    """Advance the read cursor; re-reading already-read messages writes nothing."""
     state = ChatReadState.query.filter_by(user_id=user_id, peer_id=peer_id).first()
+    if state and (state.last_read_id or 0) >= last_id:
+        return
     if not state:
         state = ChatReadState(user_id=user_id, peer_id=peer_id, last_read_id=last_id)
         db.session.add(state)
     else:
         state.last_read_id = max(state.last_read_id or 0, last_id)
+    last_read = state.last_read_id
+    unread_counters.recount_chat(user_id, peer_id)
     db.session.commit()
+    chat_receipts.note_read(user_id, peer_id, last_read)
+    publish_unread_event([user_id], 'chat')
 
 
 @csrf.exempt
@@ -719,61 +834,32 @@ def api_chat_read():
     return jsonify({'ok': True})
 
 
-@app.route('/api/chat/unread')
-def api_chat_unread():
+@app.route('/api/events')
+def api_events():
+    """Server-Sent Events stream of chat, mail, unread and task changes for the current user."""
     user = require_login()
-    latest_id = db.session.query(db.func.max(ChatMessage.id)).scalar() or 0
-    states = { (s.peer_id if s.peer_id is not None else 'group'): s.last_read_id for s in ChatReadState.query.filter_by(user_id=user.id).all() }
-
-    # group unread
-    group_last = states.get('group', 0)
-    group_unread = (
-        ChatMessage.query.filter(ChatMessage.recipient_id.is_(None))
-        .filter(ChatMessage.id > group_last)
-        .filter(ChatMessage.sender_id != user.id)
-        .count()
+    sub = hub.subscribe(user.id, user.role)
+    stream = hub.stream(sub, app.config['EVENTS_KEEPALIVE_SECONDS'])
+    return Response(
+        stream,
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
     )
-    private_counts = {}
-    if latest_id:
-        # only fetch users with messages to current user
-        privates = (
-            db.session.query(ChatMessage.sender_id, db.func.max(ChatMessage.id))
-            .filter(ChatMessage.recipient_id == user.id)
-            .group_by(ChatMessage.sender_id)
-            .all()
-        )
-        for sender_id, max_id in privates:
-            last_seen = states.get(sender_id, 0)
-            cnt = (
-                ChatMessage.query.filter(ChatMessage.sender_id == sender_id, ChatMessage.recipient_id == user.id, ChatMessage.id > last_seen).count()
-            )
-            if cnt:
-                private_counts[sender_id] = cnt
 
-    return jsonify({'group': group_unread, 'privates': private_counts})
 
-
-def _message_is_read(msg):
-    # Group: only consider other users' reads (sender's own read should not block deletion)
-    if msg.recipient_id is None:
-        other_read = ChatReadState.query.filter(
-            ChatReadState.peer_id.is_(None),
-            ChatReadState.user_id != msg.sender_id,
-            ChatReadState.last_read_id >= msg.id
-        ).first()
-        return other_read is not None
-    # Private: only the recipient's read matters
-    state = ChatReadState.query.filter_by(user_id=msg.recipient_id, peer_id=msg.sender_id).first()
-    return state is not None and state.last_read_id >= msg.id
+@app.route('/api/chat/unread')
+def api_chat_unread():
+    user = require_login()
+    return jsonify(unread_counters.chat_unread(user.id))
 
 
-def _can_delete_message(user, msg):
+def _can_delete_message(user, msg, *, fresh=False):
     if user.role == 'admin':
         return True
     if msg.sender_id != user.id:
         return False
     # Sender can delete until someone else has read it
-    return not _message_is_read(msg)
+    return msg.id > chat_receipts.read_watermark(msg.sender_id, msg.recipient_id, fresh=fresh)
 
 
 @csrf.exempt
@@ -781,10 +867,12 @@ def _can_delete_message(user, msg):
 def api_chat_delete(msg_id):
     user = require_login()
     msg = ChatMessage.query.get_or_404(msg_id)
-    if not _can_delete_message(user, msg):
+    if not _can_delete_message(user, msg, fresh=True):
         return jsonify({'error': 'اجازه حذف این پیام را ندارید.'}), 403
+    unread_counters.chat_message_removed(msg)
     db.session.delete(msg)
     db.session.commit()
+    publish_chat_event(msg, deleted=True)
     return jsonify({'ok': True})
 
 
@@ -792,8 +880,8 @@ def api_chat_delete(msg_id):
 def admin_users():
     if not session.get('user_id') or session.get('role') != 'admin':
         return redirect(url_for('login'))
-    user = User.query.get(session.get('user_id'))
-    users = User.query.order_by(User.username).all()
+    user = current_user()
+    users = users_directory().by_username
     roles = Role.query.order_by(Role.name).all()
     # ensure defaults
     existing = {r.name for r in roles}
@@ -813,6 +901,18 @@ def api_unread_mails():
     return jsonify({'count': unread_mail_count(user.id)})
 
 
+@app.route('/api/admin/notifications/outbox')
+def api_admin_outbox_stats():
+    user = require_login()
+    if user.role != 'admin':
+        return jsonify({'error': 'Not allowed'}), 403
+    if not _outbox_worker:
+        return jsonify({'error': 'Outbox worker is not running in this process.'}), 503
+    stats = _outbox_worker.stats()
+    stats['providers'] = provider_metrics()
+    return jsonify(stats)
+
+
 @csrf.exempt
 @app.route('/api/roles', methods=['GET', 'POST'])
 def api_roles():
@@ -855,6 +955,7 @@ def api_admin_users():
     new_user.set_password(password)
     db.session.add(new_user)
     db.session.commit()
+    user_directory.invalidate()
     return jsonify(new_user.to_dict()), 201
 
 
@@ -879,6 +980,7 @@ def api_admin_user_update(user_id):
     if 'is_active' in data:
         target.is_active = bool(data['is_active'])
     db.session.commit()
+    user_changed(target.id)
     return jsonify(target.to_dict())
 
 
@@ -889,18 +991,62 @@ def api_admin_user_delete(user_id):
     if user.role != 'admin':
         return jsonify({'error': 'Not allowed'}), 403
     target = User.query.get_or_404(user_id)
-    # delete related tasks/attachments/mails
-    tasks = Task.query.filter(
-        (Task.assigned_to_id == target.id) | (Task.created_by_id == target.id)
-    ).all()
-    for t in tasks:
-        for att in list(t.attachments):
-            db.session.delete(att)
-        db.session.delete(t)
-    Mail.query.filter((Mail.sender_id == target.id) | (Mail.recipient_id == target.id)).delete(synchronize_session=False)
-    db.session.delete(target)
+    removed = user_deletion.delete_user(target)
     db.session.commit()
-    return jsonify({'ok': True})
+    chat_receipts.forget_user(user_id)
+    user_changed(user_id)
+    wake_file_reclaimer()
+    return jsonify({'ok': True, 'removed': removed})
+
+
+MAIL_FOLDERS = ('inbox', 'sent', 'draft', 'trash', 'saved')
+
+
+def mail_folder_query(user_id, folder):
+    """Base query for a mailbox folder, or None for an unknown folder."""
+    base = Mail.query.filter(Mail.deleted_at.is_(None))
+    if folder == 'inbox':
+        return base.filter_by(recipient_id=user_id, is_draft=False, is_saved=False)
+    if folder == 'sent':
+        return base.filter_by(sender_id=user_id, is_draft=False)
+    if folder == 'draft':
+        return base.filter_by(sender_id=user_id, is_draft=True)
+    if folder == 'trash':
+        return Mail.query.filter(Mail.deleted_at.isnot(None)).filter(
+            (Mail.recipient_id == user_id) | (Mail.sender_id == user_id)
+        )
+    if folder == 'saved':
+        return base.filter_by(recipient_id=user_id, is_draft=False, is_saved=True)
+    return None
+
+
+MAIL_PAGE_SIZE = 50
+MAIL_PAGE_MAX = 200
+
+
+def encode_mail_cursor(mail):
+    """Opaque keyset cursor for the (created_at, id) ordering of a mail list page."""
+    stamp = mail.created_at.isoformat() if mail.created_at else ''
+    return f"{stamp}_{mail.id}"
+
+
+def decode_mail_cursor(raw):
+    """Inverse of encode_mail_cursor; raises ValueError for a malformed cursor."""
+    stamp, sep, mail_id = raw.rpartition('_')
+    if not sep:
+        raise ValueError(raw)
+    return (datetime.fromisoformat(stamp) if stamp else None), int(mail_id)
+
+
+def mail_cursor_filter(created_at, mail_id):
+    """Rows strictly after the cursor in created_at DESC, id DESC order (NULL dates sort last)."""
+    if created_at is None:
+        return and_(Mail.created_at.is_(None), Mail.id < mail_id)
+    return or_(
+        Mail.created_at < created_at,
+        and_(Mail.created_at == created_at, Mail.id < mail_id),
+        Mail.created_at.is_(None),
+    )
 
 
 @csrf.exempt
@@ -924,32 +1070,49 @@ def api_mails():
             is_read=is_draft,
         )
         db.session.add(msg)
+        if not is_draft:
+            unread_counters.bump_mail(msg.recipient_id)
+            db.session.flush()
+            notify_mail_received(msg)
         db.session.commit()
-        try:
-            if not is_draft:
-                notify_mail_received(msg)
-        except Exception:
-            logger.exception("Failed to send inbox notifications")
+        if not is_draft:
+            publish_mail_event(msg)
+            wake_outbox()
         return jsonify(msg.to_dict()), 201
 
-    folder = request.args.get('folder', 'inbox')
-    base = Mail.query.filter(Mail.deleted_at.is_(None))
-    if folder == 'inbox':
-        query = base.filter_by(recipient_id=user.id, is_draft=False, is_saved=False)
-    elif folder == 'sent':
-        query = base.filter_by(sender_id=user.id, is_draft=False)
-    elif folder == 'draft':
-        query = base.filter_by(sender_id=user.id, is_draft=True)
-    elif folder == 'trash':
-        query = Mail.query.filter(Mail.deleted_at.isnot(None)).filter(
-            (Mail.recipient_id == user.id) | (Mail.sender_id == user.id)
-        )
-    elif folder == 'saved':
-        query = base.filter_by(recipient_id=user.id, is_draft=False, is_saved=True)
-    else:
+    use_read_replica(db.session)
+    query = mail_folder_query(user.id, request.args.get('folder', 'inbox'))
+    if query is None:
         return jsonify({'error': 'Invalid folder'}), 400
-    mails = query.order_by(Mail.created_at.desc()).all()
-    return jsonify([m.to_dict() for m in mails])
+    limit = min(max(request.args.get('limit', MAIL_PAGE_SIZE, type=int), 1), MAIL_PAGE_MAX)
+    before = request.args.get('before')
+    if before:
+        try:
+            query = query.filter(mail_cursor_filter(*decode_mail_cursor(before)))
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    mails = (
+        query.options(db.defer(Mail.body), db.selectinload(Mail.sender))
+        .order_by(Mail.created_at.desc().nulls_last(), Mail.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(mails) > limit
+    mails = mails[:limit]
+    return jsonify({
+        'items': [m.to_summary_dict() for m in mails],
+        'next_cursor': encode_mail_cursor(mails[-1]) if has_more else None,
+    })
+
+
+@app.route('/api/mails/<int:mail_id>')
+def api_mail_detail(mail_id):
+    user = require_login()
+    use_read_replica(db.session)
+    mail = Mail.query.get_or_404(mail_id)
+    if mail.recipient_id != user.id and mail.sender_id != user.id:
+        return jsonify({'error': 'Not allowed'}), 403
+    return jsonify(mail.to_dict())
 
 
 @csrf.exempt
@@ -959,53 +1122,78 @@ def api_mail_read(mail_id):
     mail = Mail.query.get_or_404(mail_id)
     if mail.recipient_id != user.id and mail.sender_id != user.id:
         return jsonify({'error': 'Not allowed'}), 403
+    before = unread_counters.mail_snapshot([mail.id])
     mail.is_read = True
+    after = unread_counters.mail_snapshot([mail.id])
+    unread_counters.apply_mail_snapshot(before, after)
     db.session.commit()
+    publish_unread_event(set(before) | set(after), 'mail')
     return jsonify({'ok': True})
 
 
+MAIL_BULK_CHUNK = 500
+
+
+def mail_bulk_change(action, target, now):
+    """(values, extra filter) for a set-based bulk mail UPDATE, or None for an unknown move target."""
+    if action == 'read':
+        return {Mail.is_read: True}, Mail.is_read.is_(False)
+    if action == 'delete':
+        return {Mail.deleted_at: now}, Mail.deleted_at.is_(None)
+    if action == 'restore':
+        return {Mail.deleted_at: None}, Mail.deleted_at.isnot(None)
+    moves = {
+        'trash': {Mail.deleted_at: now, Mail.is_saved: False},
+        'inbox': {Mail.deleted_at: None, Mail.is_saved: False},
+        'saved': {Mail.deleted_at: None, Mail.is_saved: True},
+    }
+    if target not in moves:
+        return None
+    return moves[target], db.true()
+
+
 @csrf.exempt
 @app.route('/api/mails/bulk', methods=['POST'])
 def api_mail_bulk():
     user = require_login()
     data = request.get_json() or {}
-    ids = data.get('ids') or []
     action = data.get('action')
+    try:
+        ids = sorted({int(i) for i in data.get('ids') or []})
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid request'}), 400
     if not ids or action not in ('read', 'delete', 'restore', 'purge', 'move'):
         return jsonify({'error': 'Invalid request'}), 400
-    q = Mail.query.filter(Mail.id.in_(ids)).filter(
-        (Mail.recipient_id == user.id) | (Mail.sender_id == user.id)
-    )
-    now = datetime.utcnow()
-    if action == 'purge':
-        q.delete(synchronize_session=False)
-    elif action == 'move':
-        target = data.get('target')
-        for mail in q:
-            if target == 'trash':
-                mail.deleted_at = now
-                mail.is_saved = False
-            elif target == 'inbox':
-                mail.deleted_at = None
-                mail.is_saved = False
-            elif target == 'saved':
-                mail.deleted_at = None
-                mail.is_saved = True
-    else:
-        for mail in q:
-            if action == 'read':
-                mail.is_read = True
-            elif action == 'delete':
-                mail.deleted_at = now
-            elif action == 'restore':
-                mail.deleted_at = None
+    change = None
+    if action != 'purge':
+        change = mail_bulk_change(action, data.get('target'), datetime.utcnow())
+        if change is None:
+            return jsonify({'error': 'Invalid target'}), 400
+    owned = or_(Mail.recipient_id == user.id, Mail.sender_id == user.id)
+    before, after = {}, {}
+    affected = 0
+    # One UPDATE/DELETE per chunk keeps the IN list under driver parameter limits
+    for start in range(0, len(ids), MAIL_BULK_CHUNK):
+        chunk = ids[start:start + MAIL_BULK_CHUNK]
+        for user_id, count in unread_counters.mail_snapshot(chunk).items():
+            before[user_id] = before.get(user_id, 0) + count
+        q = Mail.query.filter(Mail.id.in_(chunk), owned)
+        if change is None:
+            affected += q.delete(synchronize_session=False)
+        else:
+            values, pending = change
+            affected += q.filter(pending).update(values, synchronize_session=False)
+        for user_id, count in unread_counters.mail_snapshot(chunk).items():
+            after[user_id] = after.get(user_id, 0) + count
+    unread_counters.apply_mail_snapshot(before, after)
     db.session.commit()
-    return jsonify({'ok': True})
+    publish_unread_event(set(before) | set(after), 'mail')
+    return jsonify({'ok': True, 'affected': affected})
 
 
 def project_node_payload(node):
     data = node.to_dict()
-    data['child_count'] = len(node.children)
+    data['child_count'] = ProjectNode.query.filter_by(parent_id=node.id).count()
     return data
 
 
@@ -1057,12 +1245,66 @@ def set_node_assignees(node, assignee_ids):
 @csrf.exempt
 @app.route('/api/project-tree', methods=['GET'])
 def api_project_tree_list():
+    if 'parent_id' in request.args or 'depth' in request.args:
+        return project_tree_levels()
+    # Rebuilt from the primary: a snapshot read from a lagging replica would be cached until the next edit
     try:
-        nodes = ProjectNode.query.order_by(ProjectNode.parent_id.asc(), ProjectNode.name.asc()).all()
-        return jsonify([project_node_payload(n) for n in nodes])
+        snapshot = project_tree.snapshot(app.config['PROJECT_TREE_CACHE_SECONDS'])
     except Exception as exc:
         logger.exception("Failed to load project tree")
         return jsonify([]), 200
+    if request.if_none_match.contains(snapshot.etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(snapshot.body, mimetype='application/json')
+    resp.set_etag(snapshot.etag)
+    return resp
+
+
+def project_tree_levels():
+    """``?parent_id=&depth=``: the requested levels below a node (or the main trunks), with child counts."""
+    parent_raw = request.args.get('parent_id')
+    try:
+        parent_id = None if parent_raw in (None, '', 'null') else int(parent_raw)
+        depth = int(request.args.get('depth') or 1)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid parent id or depth.'}), 400
+    depth = max(1, min(depth, project_tree.MAX_DEPTH))
+    use_read_replica(db.session)
+    return jsonify(project_tree.node_payloads(project_tree.levels_query(parent_id, depth)))
+
+
+@app.route('/api/project-tree/<int:node_id>/subtree', methods=['GET'])
+def api_project_tree_subtree(node_id):
+    use_read_replica(db.session)
+    nodes = project_tree.node_payloads(project_tree.subtree_query(node_id))
+    if not nodes:
+        return jsonify({'error': 'Node not found.'}), 404
+    return jsonify(nodes)
+
+
+PROJECT_SEARCH_LIMIT = 50
+
+
+@app.route('/api/project-tree/search', methods=['GET'])
+def api_project_tree_search():
+    """Nodes whose name starts with ``q``, each with the ancestor ids needed to expand to it."""
+    term = (request.args.get('q') or '').strip()
+    if not term:
+        return jsonify([])
+    try:
+        limit = max(1, min(int(request.args.get('limit') or PROJECT_SEARCH_LIMIT), PROJECT_SEARCH_LIMIT))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid limit.'}), 400
+    use_read_replica(db.session)
+    ids = [row[0] for row in project_tree.search_query(term).with_entities(ProjectNode.id).limit(limit)]
+    matches = project_tree.node_payloads(ProjectNode.query.filter(ProjectNode.id.in_(ids)))
+    paths = project_tree.ancestor_paths(ids)
+    order = {node_id: pos for pos, node_id in enumerate(ids)}
+    matches.sort(key=lambda n: order[n['id']])
+    for node in matches:
+        node['ancestor_ids'] = paths.get(node['id'], [])
+    return jsonify(matches)
 
 
 @csrf.exempt
@@ -1097,6 +1339,7 @@ def api_project_tree_create():
         db.session.rollback()
         return jsonify({'error': str(exc)}), 400
     db.session.commit()
+    project_tree.invalidate()
     return jsonify(project_node_payload(node)), 201
 
 
@@ -1138,14 +1381,12 @@ def api_project_tree_update(node_id):
             new_parent = ProjectNode.query.get(pid)
             if not new_parent:
                 return jsonify({'error': 'Parent node not found.'}), 404
-        cur = new_parent
-        while cur:
-            if cur.id == node.id:
-                return jsonify({'error': 'Cannot move a node under its own branch.'}), 400
-            cur = cur.parent
+        if new_parent and project_tree.is_within(new_parent.id, node.id):
+            return jsonify({'error': 'Cannot move a node under its own branch.'}), 400
         node.parent = new_parent
 
     db.session.commit()
+    project_tree.invalidate()
     return jsonify(project_node_payload(node))
 
 
@@ -1155,15 +1396,10 @@ def api_project_tree_delete(node_id):
     user = require_login()
     if user.role != 'admin':
         return jsonify({'error': 'Only admins can modify the project tree.'}), 403
-    node = ProjectNode.query.get_or_404(node_id)
-
-    def delete_subtree(n):
-        for child in list(n.children):
-            delete_subtree(child)
-        db.session.delete(n)
-
-    delete_subtree(node)
+    ProjectNode.query.get_or_404(node_id)
+    project_tree.delete_subtree(node_id)
     db.session.commit()
+    project_tree.invalidate()
     return jsonify({'ok': True})
 
 
@@ -1181,47 +1417,66 @@ def task_to_dict(task):
     return data
 
 
-@csrf.exempt
-@app.route('/api/tasks', methods=['GET'])
-def api_tasks_list():
-    user = require_login()
+def with_task_relations(query):
+    """Eager-load what task_to_dict reads so serializing a list costs a fixed number of queries."""
+    # selectinload on the many-to-ones issues one IN query per relationship over the distinct user ids
+    return query.options(
+        db.selectinload(Task.assigned_to),
+        db.selectinload(Task.created_by),
+        db.selectinload(Task.attachments),
+    )
+
+
+def task_scope_query(user, show_all=False):
+    """Tasks visible to a user on the dashboard; admins may request every task."""
     self_created_researcher = and_(
         Task.created_by_id.isnot(None),
         Task.created_by_id == Task.assigned_to_id,
         Task.assigned_to.has(User.role == 'user'),
     )
-    if user.role == 'admin' and request.args.get('all') == '1':
-        query = Task.query.filter(~self_created_researcher)
+    if user.role == 'admin' and show_all:
+        return Task.query.filter(~self_created_researcher)
+    if user.role == 'supervisor':
+        # supervisors see only tasks assigned to themselves
+        return Task.query.filter(Task.assigned_to_id == user.id)
+    # researchers/non-admin users see only tasks assigned to themselves and not to supervisors/admins
+    return Task.query.filter(
+        Task.assigned_to_id == user.id,
+        Task.assigned_to.has(User.role != 'supervisor'),
+    )
+
+
+@csrf.exempt
+@app.route('/api/tasks', methods=['GET'])
+def api_tasks_list():
+    user = require_login()
+    use_read_replica(db.session)
+    show_all = request.args.get('all') == '1'
+    query = task_scope_query(user, show_all)
+    today = date.today()
+    since_raw = request.args.get('since')
+    etag = task_feed.fingerprint(query, today, user.id, show_all, since_raw is not None)
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
+    if since_raw is None:
+        tasks = with_task_relations(task_feed.collapse_recurrences(query, today)).all()
+        resp = jsonify([task_to_dict(t) for t in tasks])
     else:
-        if user.role == 'supervisor':
-            # supervisors see only tasks assigned to themselves
-            query = Task.query.filter(Task.assigned_to_id == user.id)
+        # Incremental feed: only tasks changed after the token, or everything when it is stale
+        token = task_feed.issue_token(today)
+        since = task_feed.parse_token(since_raw, today)
+        if since is None:
+            tasks = with_task_relations(task_feed.collapse_recurrences(query, today)).all()
+            resp = jsonify({'full': True, 'tasks': [task_to_dict(t) for t in tasks], 'token': token})
         else:
-            # researchers/non-admin users see only tasks assigned to themselves and not to supervisors/admins
-            query = Task.query.filter(
-                Task.assigned_to_id == user.id,
-                Task.assigned_to.has(User.role != 'supervisor'),
-            )
-    tasks = query.order_by(Task.due_date.asc(), Task.id.asc()).all()
-    today = date.today()
-    grouped = {}
-    for t in tasks:
-        gid = t.recurrence_group_id
-        if not gid:
-            grouped.setdefault(f"single-{t.id}", t)
-            continue
-        existing = grouped.get(gid)
-        if not existing:
-            grouped[gid] = t
-            continue
-        # choose the nearest future occurrence; if none future, keep earliest
-        def score(task):
-            if task.due_date >= today:
-                return (0, task.due_date)
-            return (1, task.due_date)
-        if score(t) < score(existing):
-            grouped[gid] = t
-    return jsonify([task_to_dict(t) for t in grouped.values()])
+            changed, removed = task_feed.changes_since(query, today, since, load=with_task_relations)
+            resp = jsonify({
+                'full': False, 'changed': [task_to_dict(t) for t in changed], 'removed': removed, 'token': token,
+            })
+    resp.set_etag(etag)
+    return resp
 
 
 @csrf.exempt
@@ -1293,12 +1548,11 @@ def api_tasks_create():
         )
         db.session.add(task)
         created_tasks.append(task)
+    notify_task_assignments(created_tasks, user)
+    task_stats.tasks_changed(a.id for a in assignees)
     db.session.commit()
-    try:
-        for task in created_tasks:
-            notify_task_assignment(task, user)
-    except Exception:
-        logger.exception("Failed to send task assignment notifications")
+    publish_task_event(created_tasks, 'created')
+    wake_outbox()
     return jsonify(task_to_dict(created_tasks[0])), 201
 
 
@@ -1326,6 +1580,7 @@ def api_tasks_status(task_id):
     # Non-admin assignees of admin-created tasks must be approved
     requires_admin = task.admin_locked and user.role != 'admin'
     is_recurring = task.recurrence_type != 'one_time'
+    stats_users = {task.assigned_to_id}
     if new_status == 'pending' and requires_admin and task.view_status == 'awaiting_admin':
         task.view_status = 'seen'
         task.status = 'pending'
@@ -1338,10 +1593,14 @@ def api_tasks_status(task_id):
         if new_status in ('done', 'done-overdue') and is_recurring:
             # advance to next occurrence instead of completing
             if task.recurrence_group_id:
-                Task.query.filter(
+                sibling_filter = and_(
                     Task.recurrence_group_id == task.recurrence_group_id,
                     Task.id != task.id
-                ).delete(synchronize_session=False)
+                )
+                siblings = Task.query.filter(sibling_filter)
+                stats_users.update(row[0] for row in siblings.with_entities(Task.assigned_to_id).distinct())
+                task_feed.record_deleted_where(sibling_filter)
+                siblings.delete(synchronize_session=False)
             task.due_date = next_recurrence_date(task.due_date, task.recurrence_type)
             task.status = 'pending'
             task.view_status = 'send'
@@ -1361,7 +1620,9 @@ def api_tasks_status(task_id):
             if task.view_status != 'seen' and task.assigned_to_id == user.id:
                 task.view_status = 'seen'
                 task.viewed_at = datetime.utcnow()
+    task_stats.tasks_changed(stats_users)
     db.session.commit()
+    publish_task_event(task, 'status')
     return jsonify(task_to_dict(task))
 
 
@@ -1378,11 +1639,14 @@ def api_tasks_delete(task_id):
     targets = [task]
     if user.role == 'admin' and task.recurrence_group_id:
         targets = Task.query.filter(Task.recurrence_group_id == task.recurrence_group_id).all() or [task]
+    task_feed.record_deleted(targets)
     for t in targets:
         for att in list(t.attachments):
             db.session.delete(att)
         db.session.delete(t)
+    task_stats.tasks_changed(t.assigned_to_id for t in targets)
     db.session.commit()
+    publish_task_event(targets, 'deleted')
     return jsonify({'ok': True})
 
 
@@ -1404,7 +1668,9 @@ def api_tasks_update_due(task_id):
     except Exception:
         return jsonify({'error': 'Invalid due date format. Use YYYY-MM-DD.'}), 400
     task.due_date = due_dt
+    task_stats.tasks_changed([task.assigned_to_id])
     db.session.commit()
+    publish_task_event(task, 'updated')
     return jsonify(task_to_dict(task))
 
 
@@ -1430,7 +1696,9 @@ def api_tasks_edit(task_id):
             task.due_date = datetime.fromisoformat(due_date_raw).date()
         except Exception:
             return jsonify({'error': 'Invalid due date format. Use YYYY-MM-DD.'}), 400
+    task_stats.tasks_changed([task.assigned_to_id])
     db.session.commit()
+    publish_task_event(task, 'updated')
     return jsonify(task_to_dict(task))
 
 
@@ -1444,6 +1712,7 @@ def api_tasks_seen(task_id):
     task.view_status = 'seen'
     task.viewed_at = datetime.utcnow()
     db.session.commit()
+    publish_task_event(task, 'seen')
     return jsonify(task_to_dict(task))
 
 
@@ -1466,6 +1735,7 @@ def api_tasks_attach(task_id):
     attachment = TaskAttachment(task=task, filename=safe_name, stored_path=stored_path, uploaded_by=user)
     db.session.add(attachment)
     db.session.commit()
+    publish_task_event(task, 'attachment')
     return jsonify(task_to_dict(task))
 
 
@@ -1481,4 +1751,6 @@ def uploaded_file(filename):
 
 
 if __name__ == '__main__':
+    with app.app_context():
+        upgrade()
     app.run(host='0.0.0.0', port=9000, debug=True)
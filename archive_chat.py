@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+"""Script to move old chat messages from chat_messages into the archive table."""
+
+import argparse
+from app import app
+from chat_archive import archive_chat_messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=app.config['CHAT_ARCHIVE_DAYS'],
+                        help='Archive messages sent more than this many days ago.')
+    parser.add_argument('--batch-size', type=int, default=app.config['CHAT_ARCHIVE_BATCH_SIZE'],
+                        help='Number of messages moved per transaction.')
+    args = parser.parse_args()
+
+    with app.app_context():
+        moved = archive_chat_messages(args.days, args.batch_size)
+    print(f"✓ Archived {moved} chat message(s) older than {args.days} days")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Hot/cold storage for chat messages.
+
+``archive_chat_messages`` moves messages older than the configured age from
+``chat_messages`` into ``chat_messages_archive`` (same ids), keeping the hot table
+small. Listing endpoints read the hot table first and page backwards into the
+archive. Archived messages can no longer be deleted; they still count as unread
+until the reader's cursor passes them (``unread_counters`` recounts both tables).
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from models import db, ChatMessage, ChatMessageArchive
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_DAYS = 90
+DEFAULT_BATCH_SIZE = 500
+
+_ARCHIVED_COLUMNS = ('id', 'sender_id', 'recipient_id', 'body', 'created_at')
+
+
+def archive_chat_messages(
+    max_age_days: int = DEFAULT_ARCHIVE_DAYS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    *,
+    now: Optional[datetime] = None,
+) -> int:
+    """
+    Move chat messages older than ``max_age_days`` into the archive table.
+
+    Each batch of ``batch_size`` ids is copied and deleted in one transaction. Hot ids
+    come from AUTOINCREMENT (migration 8), so an id moved to the archive is never
+    handed out again. Returns the number of messages moved. Must be called inside an
+    application context.
+    """
+    now = now or datetime.utcnow()
+    threshold = now - timedelta(days=max_age_days)
+    batch_size = max(1, int(batch_size))
+    hot = ChatMessage.__table__
+    moved = 0
+    while True:
+        ids = [
+            row[0]
+            for row in db.session.query(ChatMessage.id)
+            .filter(ChatMessage.created_at < threshold)
+            .order_by(ChatMessage.id.asc())
+            .limit(batch_size)
+            .all()
+        ]
+        if not ids:
+            break
+        rows = db.select(*(hot.c[name] for name in _ARCHIVED_COLUMNS), db.literal(now, db.DateTime)).where(
+            hot.c.id.in_(ids)
+        )
+        db.session.execute(
+            ChatMessageArchive.__table__.insert().from_select(_ARCHIVED_COLUMNS + ('archived_at',), rows)
+        )
+        moved += ChatMessage.query.filter(ChatMessage.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        if len(ids) < batch_size:
+            break
+    if moved:
+        logger.info("Archived %s chat message(s) older than %s days", moved, max_age_days)
+    return moved
+
+
+class ChatArchiver:
+    """Background thread that runs ``archive_chat_messages`` on a fixed interval."""
+
+    def __init__(self, app, interval_seconds: float, max_age_days: int = DEFAULT_ARCHIVE_DAYS,
+                 batch_size: int = DEFAULT_BATCH_SIZE):
+        self.app = app
+        self.interval_seconds = interval_seconds
+        self.max_age_days = max_age_days
+        self.batch_size = batch_size
+        self.last_run_at: Optional[datetime] = None
+        self.last_moved = 0
+        self.total_moved = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> int:
+        with self.app.app_context():
+            try:
+                moved = archive_chat_messages(self.max_age_days, self.batch_size)
+            except Exception:
+                db.session.rollback()
+                logger.exception("Chat archive run failed")
+                moved = 0
+            finally:
+                db.session.remove()
+        self.last_run_at = datetime.utcnow()
+        self.last_moved = moved
+        self.total_moved += moved
+        return moved
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval_seconds)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="chat-archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+
+def start_chat_archiver(app) -> Optional[ChatArchiver]:
+    """Start the archiver configured by CHAT_ARCHIVE_* app config; interval <= 0 disables it."""
+    interval = float(app.config.get('CHAT_ARCHIVE_SWEEP_SECONDS', 3600) or 0)
+    if interval <= 0:
+        return None
+    archiver = ChatArchiver(
+        app,
+        interval,
+        max_age_days=int(app.config.get('CHAT_ARCHIVE_DAYS', DEFAULT_ARCHIVE_DAYS)),
+        batch_size=int(app.config.get('CHAT_ARCHIVE_BATCH_SIZE', DEFAULT_BATCH_SIZE)),
+    )
+    archiver.start()
+    return archiver
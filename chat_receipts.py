@@ -0,0 +1,67 @@
+"""
+Chat read watermarks.
+
+A sender may delete a chat message until someone else has read it. Read cursors
+(``ChatReadState.last_read_id``) only move forward, so for each sender and
+conversation it is enough to know the highest cursor of the other participants:
+the read watermark. Messages above it are unread and still deletable.
+
+Watermarks are cached per process and raised by ``note_read`` when a cursor
+advances here. A cached value can only lag behind the database, so listings use it
+and the delete endpoint re-checks with ``fresh=True``.
+"""
+import threading
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func
+
+from models import db, ChatReadState
+
+_watermarks: Dict[Tuple[int, Optional[int]], int] = {}
+_lock = threading.Lock()
+
+
+def _load(sender_id: int, peer_id: Optional[int]) -> int:
+    query = db.session.query(func.max(ChatReadState.last_read_id))
+    if peer_id is None:
+        # Group: anyone but the sender
+        query = query.filter(ChatReadState.peer_id.is_(None), ChatReadState.user_id != sender_id)
+    else:
+        # Private: only the recipient's cursor for this sender
+        query = query.filter(ChatReadState.user_id == peer_id, ChatReadState.peer_id == sender_id)
+    return query.scalar() or 0
+
+
+def read_watermark(sender_id: int, peer_id: Optional[int], *, fresh: bool = False) -> int:
+    """Highest message id read by others in ``sender_id``'s conversation with ``peer_id`` (None = group)."""
+    key = (sender_id, peer_id)
+    if not fresh:
+        with _lock:
+            cached = _watermarks.get(key)
+        if cached is not None:
+            return cached
+    value = _load(sender_id, peer_id)
+    with _lock:
+        value = max(value, _watermarks.get(key, 0))
+        _watermarks[key] = value
+    return value
+
+
+def note_read(user_id: int, peer_id: Optional[int], last_read_id: int) -> None:
+    """Raise cached watermarks after ``user_id``'s cursor for ``peer_id`` advanced (call after commit)."""
+    with _lock:
+        if peer_id is None:
+            for key, value in _watermarks.items():
+                if key[1] is None and key[0] != user_id and value < last_read_id:
+                    _watermarks[key] = last_read_id
+        else:
+            key = (peer_id, user_id)
+            if key in _watermarks and _watermarks[key] < last_read_id:
+                _watermarks[key] = last_read_id
+
+
+def forget_user(user_id: int) -> None:
+    """Drop cached watermarks involving a deleted user (call after commit; ids can be reused)."""
+    with _lock:
+        for key in [k for k in _watermarks if user_id in k]:
+            del _watermarks[key]
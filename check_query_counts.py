@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""Script to check that list endpoints issue a fixed number of queries as rows grow (N+1 guard)."""
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date, timedelta
+
+# Seeded rows go to a throwaway database, never the configured one
+_workdir = tempfile.mkdtemp(prefix='creatia-query-counts-')
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_workdir, 'query_counts.db')
+os.environ.pop('DATABASE_REPLICA_URL', None)
+
+from sqlalchemy import event
+
+from app import app, db
+from migrations import upgrade
+from models import Mail, Task, TaskAttachment, User
+
+# (label, username of the requesting user, URL)
+ENDPOINTS = [
+    ('mails inbox', 'qc-admin', '/api/mails?folder=inbox'),
+    ('mails sent', 'qc-admin', '/api/mails?folder=sent'),
+    ('tasks all (admin)', 'qc-admin', '/api/tasks?all=1'),
+    ('tasks own (researcher)', 'qc-researcher', '/api/tasks'),
+]
+
+
+def _user(username, role):
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        user = User(username=username, email=f'{username}@example.com', role=role)
+        user.set_password(os.urandom(8).hex())
+        db.session.add(user)
+        db.session.flush()
+    return user
+
+
+def seed(rows):
+    """Add ``rows`` mails and tasks, each touching a distinct user so lazy loads would multiply."""
+    admin = _user('qc-admin', 'admin')
+    researcher = _user('qc-researcher', 'user')
+    start = User.query.count()
+    for i in range(start, start + rows):
+        peer = _user(f'qc-peer-{i}', 'user')
+        db.session.add(Mail(subject=f'Mail {i}', body='x' * 200, sender_id=peer.id, recipient_id=admin.id))
+        db.session.add(Mail(subject=f'Reply {i}', body='y' * 200, sender_id=admin.id, recipient_id=peer.id))
+        for assignee in (peer, researcher):
+            task = Task(title=f'Task {i}', due_date=date.today() + timedelta(days=i),
+                        assigned_to=assignee, created_by=peer)
+            db.session.add(task)
+            db.session.add(TaskAttachment(task=task, filename='a.txt', stored_path=f'qc-{i}.txt', uploaded_by=peer))
+    db.session.commit()
+
+
+def count_queries(engine, client, url):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        resp = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    if resp.status_code != 200:
+        raise RuntimeError(f"{url} returned {resp.status_code}")
+    return len(statements)
+
+
+def client_for(username):
+    with app.app_context():
+        user = User.query.filter_by(username=username).first()
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user.id
+        sess['role'] = user.role
+    return client
+
+
+def measure():
+    """Count queries per endpoint; requests run outside any app context so each gets a fresh session."""
+    with app.app_context():
+        engine = db.engine
+    counts = {}
+    for label, username, url in ENDPOINTS:
+        client = client_for(username)
+        client.get(url)  # warm up lazily seeded counters and caches
+        counts[label] = count_queries(engine, client, url)
+    return counts
+
+
+def main(small=5, large=25):
+    app.config.update(MAIL_RETENTION_SWEEP_SECONDS=0, NOTIFY_OUTBOX_WORKERS=0)
+    with app.app_context():
+        upgrade()
+        seed(small)
+    before = measure()
+    with app.app_context():
+        seed(large - small)
+    after = measure()
+    failures = []
+    for label, _, _ in ENDPOINTS:
+        grew = after[label] != before[label]
+        mark = '✗' if grew else '✓'
+        print(f"{mark} {label}: {before[label]} queries at {small} rows, {after[label]} at {large} rows")
+        if grew:
+            failures.append(label)
+    if failures:
+        print(f"\n✗ Query count grows with rows for: {', '.join(failures)}")
+        return 1
+    print("\n✓ List endpoints use a fixed number of queries")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,11 +4,13 @@
 import os
 import sys
 from app import app, db
+from migrations import upgrade
 from models import User
 
 def create_users():
     """Create admin and test users."""
     with app.app_context():
+        upgrade()
         # Check if users already exist
         admin_exists = User.query.filter_by(username='Mostafa').first()
         test_exists = User.query.filter_by(username='test').first()
@@ -0,0 +1,116 @@
+"""
+Database engine configuration.
+
+``configure_database(app)`` fills SQLALCHEMY_DATABASE_URI / SQLALCHEMY_ENGINE_OPTIONS from
+the environment and installs a connect hook that tunes every SQLite connection
+(WAL journaling, synchronous=NORMAL, busy timeout, mmap and page cache), so readers
+keep running while a writer commits. Call it before ``db.init_app(app)``.
+
+DATABASE_URL selects the primary database (SQLite or PostgreSQL) and
+DATABASE_REPLICA_URL adds a ``replica`` bind that ``RoutingSession`` uses for
+SELECTs in requests that opted in with ``use_read_replica``.
+"""
+import logging
+import os
+import sqlite3
+
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import Select
+
+REPLICA_BIND = 'replica'
+
+logger = logging.getLogger(__name__)
+
+_sqlite_pragmas = {}
+
+
+def _env_int(name, default):
+    raw = os.environ.get(name)
+    return int(raw) if raw not in (None, '') else default
+
+
+def sqlite_pragmas_from_env():
+    return {
+        'journal_mode': os.environ.get('DB_SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('DB_SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': _env_int('DB_SQLITE_BUSY_TIMEOUT_MS', 5000),
+        'mmap_size': _env_int('DB_SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+        # negative cache_size is in KiB rather than pages
+        'cache_size': _env_int('DB_SQLITE_CACHE_SIZE', -20000),
+    }
+
+
+@event.listens_for(Engine, 'connect')
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if not _sqlite_pragmas or not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in _sqlite_pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    except sqlite3.DatabaseError:
+        logger.exception("Failed to apply SQLite pragmas")
+    finally:
+        cursor.close()
+
+
+def engine_options_from_env(uri):
+    """Pool settings for the engine; in-memory SQLite keeps SQLAlchemy's single-connection pool."""
+    if uri.startswith('sqlite') and (':memory:' in uri or uri.rstrip('/') == 'sqlite:'):
+        return {}
+    return {
+        'pool_size': _env_int('DB_POOL_SIZE', 10),
+        'max_overflow': _env_int('DB_MAX_OVERFLOW', 20),
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+    }
+
+
+def normalize_database_url(url):
+    # Heroku-style URLs use the scheme SQLAlchemy 1.4+ no longer accepts
+    if url and url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def configure_database(app, default_uri):
+    uri = normalize_database_url(os.environ.get('DATABASE_URL')) or app.config.get('SQLALCHEMY_DATABASE_URI') or default_uri
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    replica_uri = normalize_database_url(os.environ.get('DATABASE_REPLICA_URL'))
+    if replica_uri:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds.setdefault(REPLICA_BIND, replica_uri)
+        app.config['SQLALCHEMY_BINDS'] = binds
+    options = engine_options_from_env(uri)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    _sqlite_pragmas.clear()
+    _sqlite_pragmas.update(sqlite_pragmas_from_env())
+    _sqlite_pragmas.update(app.config.get('SQLITE_PRAGMAS') or {})
+    return app
+
+
+class RoutingSession(FlaskSession):
+    """
+    Session that sends plain SELECTs to the replica bind when ``use_replica`` is set in
+    ``session.info``. Flushes and bulk UPDATE/DELETE go to the primary and pin the rest
+    of the session there, so a request never reads its own writes from a lagging replica.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('use_replica') and not self.info.get('primary_pinned'):
+            if self._flushing or (clause is not None and not isinstance(clause, Select)):
+                self.info['primary_pinned'] = True
+            else:
+                replica = self._db.engines.get(REPLICA_BIND)
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def use_read_replica(session):
+    """Route this session's reads to the replica bind, when one is configured."""
+    session.info['use_replica'] = True
@@ -0,0 +1,121 @@
+"""
+In-process publish/subscribe hub backing the /api/events Server-Sent Events stream.
+
+Write handlers publish small events after their transaction commits; each open
+stream owns a bounded queue, so idle clients block on the queue without touching
+the database. Events are only delivered within one process.
+
+``ConversationSignal`` backs chat long-polling: it tracks the newest message id per
+conversation and wakes waiting requests when it advances.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Hashable, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, user_id: int, role: Optional[str], maxsize: int = 100):
+        self.user_id = user_id
+        self.role = role
+        self.queue: "queue.Queue[tuple]" = queue.Queue(maxsize=maxsize)
+
+    def wants(self, user_ids, roles) -> bool:
+        if user_ids is None and roles is None:
+            return True
+        return (user_ids is not None and self.user_id in user_ids) or (roles is not None and self.role in roles)
+
+
+class EventHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self, user_id: int, role: Optional[str] = None) -> Subscription:
+        sub = Subscription(user_id, role)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(
+        self,
+        event: str,
+        data: dict,
+        *,
+        user_ids: Optional[Iterable[int]] = None,
+        roles: Optional[Iterable[str]] = None,
+    ) -> int:
+        """Deliver an event to matching subscribers (everyone when no filter is given)."""
+        user_ids = set(user_ids) if user_ids is not None else None
+        roles = set(roles) if roles is not None else None
+        with self._lock:
+            targets = [s for s in self._subscribers if s.wants(user_ids, roles)]
+        delivered = 0
+        for sub in targets:
+            try:
+                sub.queue.put_nowait((event, data))
+                delivered += 1
+            except queue.Full:
+                logger.warning("Dropping %s event for slow subscriber user=%s", event, sub.user_id)
+        return delivered
+
+    def stream(self, sub: Subscription, keepalive_seconds: float = 25.0) -> Iterator[str]:
+        """Yield SSE-formatted frames for a subscription until the client disconnects."""
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event, data = sub.queue.get(timeout=keepalive_seconds)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            self.unsubscribe(sub)
+
+
+class ConversationSignal:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._latest = {}
+
+    def latest(self, key: Hashable) -> Optional[int]:
+        """Newest message id seen for a conversation, or None if this process has not seen it yet."""
+        with self._cond:
+            return self._latest.get(key)
+
+    def advance(self, key: Hashable, message_id: int) -> None:
+        """Record a (possibly) newer message id and wake waiters."""
+        with self._cond:
+            if message_id > self._latest.get(key, 0):
+                self._latest[key] = message_id
+                self._cond.notify_all()
+            else:
+                self._latest.setdefault(key, message_id)
+
+    def wait_for(self, key: Hashable, after_id: int, timeout: float) -> bool:
+        """Block until a message newer than ``after_id`` exists; False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._latest.get(key, 0) <= after_id:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+
+hub = EventHub()
+chat_signal = ConversationSignal()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""Script to check that hot endpoint queries use an index (SQLite EXPLAIN QUERY PLAN)."""
+
+import atexit
+import os
+import re
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+from types import SimpleNamespace
+
+# Plans come from a freshly migrated throwaway database, never the configured one
+_workdir = tempfile.mkdtemp(prefix='creatia-explain-')
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_workdir, 'explain.db')
+os.environ.pop('DATABASE_REPLICA_URL', None)
+
+from app import app, db, conversation_filter, mail_cursor_filter, mail_folder_query, task_scope_query, MAIL_FOLDERS
+from migrations import upgrade
+from models import ChatMessage, ChatMessageArchive, FileReclaim, Mail, NotificationOutbox, ProjectNode, Task
+import project_tree
+
+FULL_SCAN = re.compile(r'^SCAN (\w+)\b(?! USING)')
+
+
+def hot_queries(user_id=1, peer_id=2):
+    """Representative statements issued by the polled endpoints and background workers."""
+    now = datetime.utcnow()
+    researcher = SimpleNamespace(id=user_id, role='researcher')
+    supervisor = SimpleNamespace(id=user_id, role='supervisor')
+    queries = {
+        f'mails folder={folder}': mail_folder_query(user_id, folder).order_by(Mail.created_at.desc().nulls_last(), Mail.id.desc())
+        for folder in MAIL_FOLDERS
+    }
+    queries['mails inbox page before cursor'] = (
+        mail_folder_query(user_id, 'inbox').filter(mail_cursor_filter(now, 1 << 30))
+        .order_by(Mail.created_at.desc().nulls_last(), Mail.id.desc()).limit(50)
+    )
+    queries.update({
+        'mails retention purge': Mail.query.filter(Mail.deleted_at.isnot(None), Mail.deleted_at < now),
+        'chat group after id': ChatMessage.query.filter(conversation_filter(user_id, None), ChatMessage.id > 0)
+        .order_by(ChatMessage.id.asc()),
+        'chat private after id': ChatMessage.query.filter(conversation_filter(user_id, peer_id), ChatMessage.id > 0)
+        .order_by(ChatMessage.id.asc()),
+        'chat archive private before id': ChatMessageArchive.query.filter(
+            conversation_filter(user_id, peer_id, ChatMessageArchive), ChatMessageArchive.id < 1 << 30,
+        ).order_by(ChatMessageArchive.id.desc()),
+        'chat private unread': ChatMessage.query.filter(
+            ChatMessage.sender_id == peer_id, ChatMessage.recipient_id == user_id, ChatMessage.id > 0,
+        ),
+        'tasks researcher': task_scope_query(researcher).order_by(Task.due_date.asc(), Task.id.asc()),
+        'tasks supervisor': task_scope_query(supervisor).order_by(Task.due_date.asc(), Task.id.asc()),
+        'tasks recurrence group': Task.query.filter(Task.recurrence_group_id == 'group').order_by(Task.due_date.asc()),
+        'outbox due rows': db.session.query(NotificationOutbox.id).filter(
+            NotificationOutbox.status.in_(('pending', 'sending')), NotificationOutbox.next_attempt_at <= now,
+        ).order_by(NotificationOutbox.next_attempt_at.asc(), NotificationOutbox.id.asc()),
+        'project tree name search': project_tree.search_query('alpha').with_entities(ProjectNode.id).limit(50),
+        'file reclaim due rows': FileReclaim.query.filter(FileReclaim.next_attempt_at <= now, FileReclaim.id > 0)
+        .order_by(FileReclaim.id.asc()).limit(100),
+    })
+    return queries
+
+
+def explain(query):
+    compiled = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    params = compiled.construct_params()
+    args = tuple(params[name] for name in compiled.positiontup or ())
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", args).fetchall()
+    return [row[-1] for row in rows]
+
+
+def main():
+    with app.app_context():
+        upgrade()
+        failures = []
+        for name, query in hot_queries().items():
+            plan = explain(query)
+            scans = [line for line in plan if FULL_SCAN.match(line)]
+            mark = '✗' if scans else '✓'
+            print(f"{mark} {name}")
+            for line in plan:
+                print(f"    {line}")
+            if scans:
+                failures.append(name)
+    if failures:
+        print(f"\n✗ {len(failures)} hot query(ies) scan a full table: {', '.join(failures)}")
+        return 1
+    print("\n✓ All hot queries use an index")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
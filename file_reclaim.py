@@ -0,0 +1,182 @@
+"""
+Background reclaim of orphaned upload files.
+
+Deletions queue the stored paths of the files they orphan as ``FileReclaim`` rows in
+their own transaction, so a file is only unlinked once the rows that referenced it
+are gone for good (a rolled back delete leaves no queue entry behind). The
+``FileReclaimer`` thread drains the queue when woken after a commit and on a poll
+interval; failed unlinks are retried with a growing delay up to ``max_attempts``.
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Set
+
+from werkzeug.security import safe_join
+
+from models import db, FileReclaim, TaskAttachment, User
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_ATTEMPTS = 5
+RETRY_DELAY = timedelta(minutes=5)
+
+
+def enqueue(paths: Iterable[Optional[str]]) -> int:
+    """Queue stored paths (relative to UPLOAD_FOLDER) for unlinking; empty values are ignored."""
+    unique = list(dict.fromkeys(p for p in paths if p))
+    db.session.add_all(FileReclaim(stored_path=p) for p in unique)
+    return len(unique)
+
+
+def enqueue_from(paths_select) -> None:
+    """Queue the stored paths returned by a one-column SELECT without loading them."""
+    now = datetime.utcnow()
+    rows = db.select(
+        paths_select.subquery().c[0], db.literal(0), db.literal(now, db.DateTime), db.literal(now, db.DateTime),
+    )
+    db.session.execute(
+        FileReclaim.__table__.insert().from_select(
+            ['stored_path', 'attempts', 'next_attempt_at', 'created_at'], rows,
+        )
+    )
+
+
+def _still_referenced(paths: Set[str]) -> Set[str]:
+    """Queued paths that a live row points at again (e.g. a restored or re-used upload)."""
+    if not paths:
+        return set()
+    referenced = {
+        row[0] for row in db.session.query(TaskAttachment.stored_path).filter(TaskAttachment.stored_path.in_(paths))
+    }
+    for resume_path, avatar_path in db.session.query(User.resume_path, User.avatar_path).filter(
+        User.resume_path.in_(paths) | User.avatar_path.in_(paths)
+    ):
+        referenced.update({resume_path, avatar_path})
+    return referenced & paths
+
+
+def reclaim_files(
+    upload_folder: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    *,
+    now: Optional[datetime] = None,
+) -> int:
+    """
+    Unlink queued files that are due, committing after each batch of ``batch_size`` rows.
+
+    Missing files count as reclaimed. Returns the number of queue entries completed.
+    Must be called inside an application context.
+    """
+    now = now or datetime.utcnow()
+    batch_size = max(1, int(batch_size))
+    reclaimed = 0
+    last_id = 0
+    while True:
+        rows = (
+            FileReclaim.query.filter(FileReclaim.next_attempt_at <= now, FileReclaim.id > last_id)
+            .order_by(FileReclaim.id.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1].id
+        referenced = _still_referenced({row.stored_path for row in rows})
+        for row in rows:
+            if row.stored_path not in referenced:
+                full_path = safe_join(upload_folder, row.stored_path)
+                if full_path is None:
+                    logger.error("Dropping file reclaim entry outside the upload folder: %r", row.stored_path)
+                else:
+                    try:
+                        os.remove(full_path)
+                    except FileNotFoundError:
+                        pass
+                    except OSError as exc:
+                        row.attempts += 1
+                        row.last_error = str(exc)
+                        if row.attempts < max_attempts:
+                            row.next_attempt_at = now + RETRY_DELAY * row.attempts
+                            continue
+                        logger.error("Giving up on reclaiming %s after %s attempts: %s",
+                                     row.stored_path, row.attempts, exc)
+            db.session.delete(row)
+            reclaimed += 1
+        db.session.commit()
+        if len(rows) < batch_size:
+            break
+    if reclaimed:
+        logger.info("Reclaimed %s orphaned upload file(s)", reclaimed)
+    return reclaimed
+
+
+class FileReclaimer:
+    """Background thread that runs ``reclaim_files`` when woken and on a fixed interval."""
+
+    def __init__(self, app, interval_seconds: float, batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.app = app
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.last_run_at: Optional[datetime] = None
+        self.total_reclaimed = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> int:
+        with self.app.app_context():
+            try:
+                reclaimed = reclaim_files(self.app.config['UPLOAD_FOLDER'], self.batch_size, self.max_attempts)
+            except Exception:
+                db.session.rollback()
+                logger.exception("File reclaim run failed")
+                reclaimed = 0
+            finally:
+                db.session.remove()
+        self.last_run_at = datetime.utcnow()
+        self.total_reclaimed += reclaimed
+        return reclaimed
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._wake.wait(self.interval_seconds)
+            self._wake.clear()
+
+    def wake(self):
+        """Signal that new entries were committed so they are reclaimed without waiting for the poll."""
+        self._wake.set()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="file-reclaimer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+
+def start_file_reclaimer(app) -> Optional[FileReclaimer]:
+    """Start the reclaimer configured by FILE_RECLAIM_* app config; interval <= 0 disables it."""
+    interval = float(app.config.get('FILE_RECLAIM_POLL_SECONDS', 300) or 0)
+    if interval <= 0:
+        return None
+    reclaimer = FileReclaimer(
+        app,
+        interval,
+        batch_size=int(app.config.get('FILE_RECLAIM_BATCH_SIZE', DEFAULT_BATCH_SIZE)),
+        max_attempts=int(app.config.get('FILE_RECLAIM_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)),
+    )
+    reclaimer.start()
+    return reclaimer
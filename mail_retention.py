@@ -0,0 +1,110 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from models import db, Mail
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETENTION_DAYS = 20
+DEFAULT_BATCH_SIZE = 500
+
+
+def purge_deleted_mails(
+    retention_days: int = DEFAULT_RETENTION_DAYS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    *,
+    now: Optional[datetime] = None,
+) -> int:
+    """
+    Permanently delete trashed mails older than ``retention_days``.
+
+    Rows are removed in batches of ``batch_size`` ids, committing after each batch
+    so the database write lock is only held briefly. Returns the number of mails removed.
+    Must be called inside an application context.
+    """
+    threshold = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    batch_size = max(1, int(batch_size))
+    removed = 0
+    while True:
+        ids = [
+            row[0]
+            for row in db.session.query(Mail.id)
+            .filter(Mail.deleted_at.isnot(None), Mail.deleted_at < threshold)
+            .order_by(Mail.id.asc())
+            .limit(batch_size)
+            .all()
+        ]
+        if not ids:
+            break
+        removed += Mail.query.filter(Mail.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        if len(ids) < batch_size:
+            break
+    if removed:
+        logger.info("Purged %s trashed mail(s) older than %s days", removed, retention_days)
+    return removed
+
+
+class TrashSweeper:
+    """Background thread that runs ``purge_deleted_mails`` on a fixed interval."""
+
+    def __init__(self, app, interval_seconds: float, retention_days: int = DEFAULT_RETENTION_DAYS,
+                 batch_size: int = DEFAULT_BATCH_SIZE):
+        self.app = app
+        self.interval_seconds = interval_seconds
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.last_run_at: Optional[datetime] = None
+        self.last_removed = 0
+        self.total_removed = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> int:
+        with self.app.app_context():
+            try:
+                removed = purge_deleted_mails(self.retention_days, self.batch_size)
+            except Exception:
+                db.session.rollback()
+                logger.exception("Trash sweep failed")
+                removed = 0
+            finally:
+                db.session.remove()
+        self.last_run_at = datetime.utcnow()
+        self.last_removed = removed
+        self.total_removed += removed
+        return removed
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval_seconds)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="trash-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+
+def start_trash_sweeper(app) -> Optional[TrashSweeper]:
+    """Start the sweeper configured by MAIL_RETENTION_* app config; interval <= 0 disables it."""
+    interval = float(app.config.get('MAIL_RETENTION_SWEEP_SECONDS', 3600) or 0)
+    if interval <= 0:
+        return None
+    sweeper = TrashSweeper(
+        app,
+        interval,
+        retention_days=int(app.config.get('MAIL_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)),
+        batch_size=int(app.config.get('MAIL_RETENTION_BATCH_SIZE', DEFAULT_BATCH_SIZE)),
+    )
+    sweeper.start()
+    return sweeper
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+"""Script to apply pending database schema migrations."""
+
+import argparse
+from app import app
+from migrations import MIGRATIONS, current_version, latest_version, upgrade
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--status', action='store_true', help='Show the schema version without migrating.')
+    args = parser.parse_args()
+
+    with app.app_context():
+        current = current_version()
+        if args.status:
+            print(f"Schema version: {current} (latest {latest_version()})")
+            for version, name, _fn in MIGRATIONS:
+                mark = '✓' if version <= current else ' '
+                print(f"  [{mark}] {version:03d} {name}")
+            return
+        applied = upgrade()
+    if applied:
+        print(f"✓ Applied migration(s): {', '.join(str(v) for v in applied)}")
+    else:
+        print(f"✓ Schema already up to date (version {current})")
+
+
+if __name__ == '__main__':
+    main()
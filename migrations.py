@@ -0,0 +1,185 @@
+"""
+Versioned schema migrations.
+
+Each migration is registered in order with ``@migration(version, name)`` and must be
+idempotent. ``upgrade()`` applies the pending ones and records them in
+``schema_migrations``; it is run explicitly via ``python migrate.py`` so that process
+start only needs ``current_version()``.
+"""
+import logging
+from typing import Callable, List, Tuple
+
+from sqlalchemy.schema import CreateIndex
+
+from models import db, User, Task, Mail, ProjectNode, NotificationOutbox, SchemaMigration, TaskTombstone, ChatMessage, ChatMessageArchive, FileReclaim, TaskStats
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS: List[Tuple[int, str, Callable[[], None]]] = []
+
+
+def migration(version: int, name: str):
+    def register(fn):
+        if MIGRATIONS and version <= MIGRATIONS[-1][0]:
+            raise ValueError(f"Migration {version} registered out of order")
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return register
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def current_version() -> int:
+    """Highest applied migration, or 0 for a database that was never migrated."""
+    try:
+        return db.session.query(db.func.max(SchemaMigration.version)).scalar() or 0
+    except Exception:
+        db.session.rollback()
+        return 0
+
+
+def pending_migrations():
+    current = current_version()
+    return [m for m in MIGRATIONS if m[0] > current]
+
+
+def upgrade() -> List[int]:
+    """Apply pending migrations in order, each in its own transaction; returns applied versions."""
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    applied = []
+    for version, name, fn in pending_migrations():
+        logger.info("Applying migration %s: %s", version, name)
+        try:
+            fn()
+            db.session.add(SchemaMigration(version=version, name=name))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            if db.session.get(SchemaMigration, version):
+                # Another process applied it concurrently; migrations are idempotent.
+                continue
+            raise
+        applied.append(version)
+    return applied
+
+
+def ensure_model_columns(inspector, model, names):
+    """Add missing model columns using DDL compiled for the active dialect."""
+    table = model.__table__
+    if not inspector.has_table(table.name):
+        return
+    existing = {col['name'] for col in inspector.get_columns(table.name)}
+    dialect = db.engine.dialect
+    for name in names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        ddl = f"ALTER TABLE {table.name} ADD COLUMN {name} {column.type.compile(dialect=dialect)}"
+        if column.default is not None and column.default.is_scalar:
+            literal = db.literal(column.default.arg, type_=column.type)
+            ddl += f" DEFAULT {literal.compile(dialect=dialect, compile_kwargs={'literal_binds': True})}"
+        for fk in column.foreign_keys:
+            ddl += f" REFERENCES {fk.column.table.name}({fk.column.name})"
+        db.session.execute(db.text(ddl))
+
+
+# Columns added after the first release; pre-migration databases get them via ALTER TABLE
+LEGACY_COMPAT_COLUMNS = {
+    User: ['full_name', 'education', 'resume_path', 'avatar_path', 'avatar_scale', 'avatar_offset_x',
+           'avatar_offset_y', 'responsibility', 'profile_files', 'phone_number'],
+    Task: ['description', 'view_status', 'viewed_at', 'approved_at', 'recurrence_type',
+           'recurrence_group_id', 'submitted_at'],
+    Mail: ['is_draft', 'deleted_at', 'is_saved'],
+    ProjectNode: ['researcher_id'],
+    NotificationOutbox: ['template_data'],
+}
+
+
+@migration(1, 'baseline schema')
+def _baseline():
+    db.create_all()
+    inspector = db.inspect(db.engine)
+    for model, column_names in LEGACY_COMPAT_COLUMNS.items():
+        ensure_model_columns(inspector, model, column_names)
+
+
+def create_indexes(*names):
+    """Create model-declared indexes by name if they do not exist yet."""
+    wanted = set(names)
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in wanted:
+                # IF NOT EXISTS rather than checkfirst: SQLite does not reflect expression indexes
+                db.session.execute(CreateIndex(index, if_not_exists=True))
+                wanted.discard(index.name)
+    if wanted:
+        raise ValueError(f"Unknown index name(s): {', '.join(sorted(wanted))}")
+
+
+@migration(2, 'composite indexes for hot queries')
+def _hot_query_indexes():
+    create_indexes(
+        'ix_tasks_assignee_due',
+        'ix_tasks_recurrence_due',
+        'ix_chat_messages_conversation',
+        'ix_mails_recipient_folder',
+        'ix_mails_sender_folder',
+        'ix_mails_trashed',
+        'ix_notification_outbox_due',
+    )
+
+
+@migration(3, 'task tombstones for the incremental task feed')
+def _task_tombstones():
+    TaskTombstone.__table__.create(db.engine, checkfirst=True)
+
+
+@migration(4, 'chat message archive')
+def _chat_archive():
+    ChatMessageArchive.__table__.create(db.engine, checkfirst=True)
+
+
+@migration(5, 'file reclaim queue')
+def _file_reclaim_queue():
+    FileReclaim.__table__.create(db.engine, checkfirst=True)
+
+
+@migration(6, 'project node name search index')
+def _project_node_name_index():
+    create_indexes('ix_project_nodes_name_lower')
+
+
+@migration(7, 'rolling task statistics')
+def _task_stats():
+    TaskStats.__table__.create(db.engine, checkfirst=True)
+
+
+@migration(8, 'never reuse chat message ids')
+def _chat_message_autoincrement():
+    """Rebuild chat_messages with AUTOINCREMENT and start its ids above every archived one."""
+    if db.engine.dialect.name != 'sqlite':
+        return  # Sequences on other databases never hand out an id twice
+    conn = db.session.connection()
+    ddl = conn.execute(db.text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'chat_messages'"
+    )).scalar()
+    if 'AUTOINCREMENT' not in ddl.upper():
+        conn.execute(db.text('ALTER TABLE chat_messages RENAME TO chat_messages_old'))
+        old_indexes = conn.execute(db.text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'chat_messages_old' AND sql IS NOT NULL"
+        )).scalars().all()
+        for name in old_indexes:
+            conn.execute(db.text(f'DROP INDEX "{name}"'))
+        ChatMessage.__table__.create(conn)
+        columns = ', '.join(column.name for column in ChatMessage.__table__.columns)
+        conn.execute(db.text(f'INSERT INTO chat_messages ({columns}) SELECT {columns} FROM chat_messages_old'))
+        conn.execute(db.text('DROP TABLE chat_messages_old'))
+    floor = max(
+        db.session.query(db.func.max(ChatMessage.id)).scalar() or 0,
+        db.session.query(db.func.max(ChatMessageArchive.id)).scalar() or 0,
+        conn.execute(db.text("SELECT seq FROM sqlite_sequence WHERE name = 'chat_messages'")).scalar() or 0,
+    )
+    conn.execute(db.text("DELETE FROM sqlite_sequence WHERE name = 'chat_messages'"))
+    conn.execute(db.text("INSERT INTO sqlite_sequence (name, seq) VALUES ('chat_messages', :seq)"), {'seq': floor})
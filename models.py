@@ -2,8 +2,9 @@ import os
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, date, timedelta
+from db_config import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 class User(db.Model):
@@ -71,6 +72,10 @@ class User(db.Model):
 class Task(db.Model):
     """Task model for user assignments"""
     __tablename__ = 'tasks'
+    __table_args__ = (
+        db.Index('ix_tasks_assignee_due', 'assigned_to_id', 'due_date', 'id'),
+        db.Index('ix_tasks_recurrence_due', 'recurrence_group_id', 'due_date'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
@@ -86,6 +91,8 @@ class Task(db.Model):
     submitted_at = db.Column(db.DateTime, nullable=True)
     recurrence_type = db.Column(db.String(20), default='one_time', nullable=False)  # one_time/daily/weekly/monthly/yearly
     recurrence_group_id = db.Column(db.String(64), nullable=True, index=True)
+    # Earliest due date in the recurrence group; only loaded by task_feed.collapse_recurrences
+    first_due = db.query_expression()
 
     assigned_to_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     created_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
@@ -102,6 +109,7 @@ class Task(db.Model):
             'title': self.title,
             'description': self.description,
             'due_date': self.due_date.isoformat(),
+            'first_due': (self.first_due or self.due_date).isoformat(),
             'status': self.status,
             'view_status': self.view_status,
             'viewed_at': self.viewed_at.isoformat() if self.viewed_at else None,
@@ -150,6 +158,28 @@ class TaskAttachment(db.Model):
         }
 
 
+class TaskTombstone(db.Model):
+    """Recently deleted task ids, kept so the incremental task feed can report removals"""
+    __tablename__ = 'task_tombstones'
+
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, nullable=False)
+    recurrence_group_id = db.Column(db.String(64), nullable=True)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class FileReclaim(db.Model):
+    """Upload files orphaned by deletions, unlinked by the background file reclaimer"""
+    __tablename__ = 'file_reclaim_queue'
+
+    id = db.Column(db.Integer, primary_key=True)
+    stored_path = db.Column(db.String(255), nullable=False)  # relative to UPLOAD_FOLDER
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
 class ProjectNodeAssignee(db.Model):
     """Assignment pivot for project nodes"""
     __tablename__ = 'project_node_assignees'
@@ -236,9 +266,18 @@ class ProjectNode(db.Model):
         }
 
 
+# Case-insensitive prefix search on node names (project_tree.search_query)
+db.Index('ix_project_nodes_name_lower', db.func.lower(ProjectNode.name))
+
+
 class ChatMessage(db.Model):
     """Chat messages for group and private conversations"""
     __tablename__ = 'chat_messages'
+    __table_args__ = (
+        db.Index('ix_chat_messages_conversation', 'recipient_id', 'sender_id', 'id'),
+        # Ids of deleted messages are never reused; archived messages keep theirs
+        {'sqlite_autoincrement': True},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
@@ -262,6 +301,26 @@ class ChatMessage(db.Model):
         }
 
 
+class ChatMessageArchive(db.Model):
+    """Chat messages moved out of chat_messages by the archiver; ids are kept"""
+    __tablename__ = 'chat_messages_archive'
+    __table_args__ = (
+        db.Index('ix_chat_messages_archive_conversation', 'recipient_id', 'sender_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    recipient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    body = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    sender = db.relationship('User', foreign_keys=[sender_id])
+
+    # Same payload as live messages so clients cannot tell them apart
+    to_dict = ChatMessage.to_dict
+
+
 class ChatReadState(db.Model):
     """Tracks last read chat message per user/peer (peer_id is null for group)"""
     __tablename__ = 'chat_read_state'
@@ -275,9 +334,46 @@ class ChatReadState(db.Model):
     user = db.relationship('User', foreign_keys=[user_id])
     peer = db.relationship('User', foreign_keys=[peer_id])
 
+class UnreadCounter(db.Model):
+    """Denormalized unread count per user and channel ('mail', 'chat:group', 'chat:<peer_id>')"""
+    __tablename__ = 'unread_counters'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    channel = db.Column(db.String(32), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+
+class TaskStats(db.Model):
+    """Rolling per-assignee task counters ('overdue' is as of computed_on), maintained by task_stats"""
+    __tablename__ = 'task_stats'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    assigned = db.Column(db.Integer, default=0, nullable=False)
+    completed = db.Column(db.Integer, default=0, nullable=False)
+    overdue = db.Column(db.Integer, default=0, nullable=False)
+    computed_on = db.Column(db.Date, nullable=False)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
 class Mail(db.Model):
     """Simple mailbox message"""
     __tablename__ = 'mails'
+    __table_args__ = (
+        # Live folders (inbox/saved/sent/draft) only ever look at non-deleted mail
+        db.Index(
+            'ix_mails_recipient_folder', 'recipient_id', 'is_draft', 'is_saved', 'created_at',
+            sqlite_where=db.text('deleted_at IS NULL'), postgresql_where=db.text('deleted_at IS NULL'),
+        ),
+        db.Index(
+            'ix_mails_sender_folder', 'sender_id', 'is_draft', 'created_at',
+            sqlite_where=db.text('deleted_at IS NULL'), postgresql_where=db.text('deleted_at IS NULL'),
+        ),
+        # Trash folder and retention purge
+        db.Index(
+            'ix_mails_trashed', 'deleted_at',
+            sqlite_where=db.text('deleted_at IS NOT NULL'), postgresql_where=db.text('deleted_at IS NOT NULL'),
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     subject = db.Column(db.String(255), nullable=False)
@@ -294,10 +390,15 @@ class Mail(db.Model):
     recipient = db.relationship('User', foreign_keys=[recipient_id], backref='received_mails')
 
     def to_dict(self):
+        data = self.to_summary_dict()
+        data['body'] = self.body
+        return data
+
+    def to_summary_dict(self):
+        """List projection without the body; fetch /api/mails/<id> for the full message."""
         return {
             'id': self.id,
             'subject': self.subject,
-            'body': self.body,
             'sender': self.sender.username if self.sender else 'System',
             'recipient_id': self.recipient_id,
             'is_read': self.is_read,
@@ -307,6 +408,52 @@ class Mail(db.Model):
         }
 
 
+class NotificationOutbox(db.Model):
+    """Pending email/SMS deliveries dispatched by the background outbox worker"""
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (
+        db.Index('ix_notification_outbox_due', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(10), nullable=False)  # email|sms
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=True)
+    body = db.Column(db.Text, nullable=False)
+    sender_name = db.Column(db.String(120), nullable=True)
+    template_data = db.Column(db.Text, nullable=True)  # JSON substitutions applied per recipient
+    status = db.Column(db.String(10), default='pending', nullable=False, index=True)  # pending|sending|sent|failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    claim_token = db.Column(db.String(32), nullable=True, index=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'channel': self.channel,
+            'recipient': self.recipient,
+            'subject': self.subject,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None,
+        }
+
+
+class SchemaMigration(db.Model):
+    """Applied schema migrations; the highest version is the current schema version"""
+    __tablename__ = 'schema_migrations'
+
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(120), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
 class Role(db.Model):
     __tablename__ = 'roles'
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,307 @@
+"""
+Durable notification outbox.
+
+Request handlers enqueue ``NotificationOutbox`` rows inside their own transaction
+and return once it commits. ``OutboxWorker`` claims due rows in batches, dispatches
+them concurrently on a thread pool and retries failures with exponential backoff.
+Email rows sharing a template are sent as one provider batch.
+"""
+import json
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+from models import db, NotificationOutbox
+from notification_service import (
+    email_configured,
+    sms_configured,
+    send_bulk_email_notification,
+    send_sms_notification,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_user_notification(
+    user,
+    subject: str,
+    email_body: str,
+    sms_body: Optional[str] = None,
+    *,
+    sender_name: Optional[str] = None,
+) -> int:
+    """Add email + SMS outbox rows for a user to the current session; the caller commits."""
+    if not user:
+        return 0
+    rows = []
+    if user.email and email_configured():
+        rows.append(NotificationOutbox(
+            channel='email', recipient=user.email, subject=subject, body=email_body, sender_name=sender_name,
+        ))
+    phone = getattr(user, 'phone_number', None)
+    if phone and sms_configured():
+        rows.append(NotificationOutbox(channel='sms', recipient=phone, subject=subject, body=sms_body or subject))
+    db.session.add_all(rows)
+    return len(rows)
+
+
+def enqueue_bulk_notification(
+    users: Iterable,
+    subject: str,
+    email_template: str,
+    sms_body: str,
+    substitutions: Callable[[object], dict],
+    *,
+    sender_name: Optional[str] = None,
+) -> int:
+    """
+    Queue one templated notification for many users; the caller commits.
+
+    ``email_template`` may contain substitution keys (e.g. ``-name-``) filled per user by
+    ``substitutions(user)``; rows sharing the template are dispatched as one email batch.
+    """
+    rows = []
+    send_email = email_configured()
+    send_sms = sms_configured()
+    for user in users:
+        if not user:
+            continue
+        if user.email and send_email:
+            rows.append(NotificationOutbox(
+                channel='email', recipient=user.email, subject=subject, body=email_template,
+                sender_name=sender_name, template_data=json.dumps(substitutions(user)),
+            ))
+        phone = getattr(user, 'phone_number', None)
+        if phone and send_sms:
+            rows.append(NotificationOutbox(channel='sms', recipient=phone, subject=subject, body=sms_body))
+    db.session.add_all(rows)
+    return len(rows)
+
+
+def _send_email_batch(rows: List[NotificationOutbox]) -> List[bool]:
+    first = rows[0]
+    recipients = [
+        {'email': row.recipient, 'substitutions': json.loads(row.template_data) if row.template_data else None}
+        for row in rows
+    ]
+    return send_bulk_email_notification(recipients, first.subject or '', first.body, sender_name=first.sender_name)
+
+
+def _send_sms_batch(rows: List[NotificationOutbox]) -> List[bool]:
+    # Twilio has no multi-recipient send; each SMS is its own request over the pooled session.
+    return [send_sms_notification(row.recipient, row.body) for row in rows]
+
+
+# Each sender takes a group of rows and returns one success flag per row.
+DEFAULT_SENDERS: Dict[str, Callable[[List[NotificationOutbox]], List[bool]]] = {
+    'email': _send_email_batch,
+    'sms': _send_sms_batch,
+}
+BATCHED_CHANNELS = {'email'}
+
+
+def _group_rows(rows: List[NotificationOutbox]) -> List[List[NotificationOutbox]]:
+    """Group batchable rows sharing channel/subject/body/sender; others are sent alone."""
+    groups: Dict[tuple, List[NotificationOutbox]] = {}
+    singles = []
+    for row in rows:
+        if row.channel in BATCHED_CHANNELS:
+            groups.setdefault((row.channel, row.subject, row.body, row.sender_name), []).append(row)
+        else:
+            singles.append([row])
+    return list(groups.values()) + singles
+
+
+class OutboxWorker:
+    """Background dispatcher for the notification outbox."""
+
+    def __init__(self, app, *, senders=None, concurrency: int = 8, batch_size: int = 50,
+                 poll_interval: float = 2.0, max_attempts: int = 5, backoff_base: float = 30.0,
+                 lease_seconds: float = 300.0):
+        self.app = app
+        self.senders = dict(senders or DEFAULT_SENDERS)
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.lease_seconds = lease_seconds
+        self.sent_count = 0
+        self.failed_count = 0
+        self.retried_count = 0
+        self.last_latency: Optional[float] = None
+        self._latency_total = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    # ----- claiming -----
+
+    def _claim_batch(self):
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        due = (
+            db.session.query(NotificationOutbox.id)
+            .filter(NotificationOutbox.status.in_(('pending', 'sending')), NotificationOutbox.next_attempt_at <= now)
+            .order_by(NotificationOutbox.next_attempt_at.asc(), NotificationOutbox.id.asc())
+            .limit(self.batch_size)
+        )
+        ids = [row[0] for row in due]
+        if not ids:
+            return []
+        # Re-check due-ness in the UPDATE so concurrent workers never claim the same row;
+        # the lease lets another worker pick up rows abandoned by a crashed process.
+        NotificationOutbox.query.filter(
+            NotificationOutbox.id.in_(ids),
+            NotificationOutbox.status.in_(('pending', 'sending')),
+            NotificationOutbox.next_attempt_at <= now,
+        ).update({
+            NotificationOutbox.status: 'sending',
+            NotificationOutbox.claim_token: token,
+            NotificationOutbox.next_attempt_at: now + timedelta(seconds=self.lease_seconds),
+        }, synchronize_session=False)
+        db.session.commit()
+        rows = NotificationOutbox.query.filter_by(claim_token=token, status='sending').all()
+        for row in rows:
+            db.session.expunge(row)
+        return rows
+
+    # ----- dispatch -----
+
+    def _dispatch(self, group: List[NotificationOutbox]):
+        channel = group[0].channel
+        sender = self.senders.get(channel)
+        if sender is None:
+            return [(False, f"No sender for channel {channel}")] * len(group)
+        try:
+            flags = list(sender(group))
+        except Exception as exc:
+            logger.exception("Outbox dispatch error for %s %s row(s)", len(group), channel)
+            return [(False, str(exc))] * len(group)
+        return [(bool(ok), None if ok else 'Provider rejected the message') for ok in flags]
+
+    def _record(self, row: NotificationOutbox, ok: bool, error: Optional[str]):
+        now = datetime.utcnow()
+        attempts = (row.attempts or 0) + 1
+        values = {NotificationOutbox.attempts: attempts, NotificationOutbox.claim_token: None}
+        if ok:
+            values.update({NotificationOutbox.status: 'sent', NotificationOutbox.sent_at: now,
+                           NotificationOutbox.last_error: None})
+            latency = (now - row.created_at).total_seconds() if row.created_at else 0.0
+            with self._lock:
+                self.sent_count += 1
+                self.last_latency = latency
+                self._latency_total += latency
+        elif attempts >= self.max_attempts:
+            values.update({NotificationOutbox.status: 'failed', NotificationOutbox.last_error: error})
+            with self._lock:
+                self.failed_count += 1
+        else:
+            delay = self.backoff_base * (2 ** (attempts - 1))
+            values.update({
+                NotificationOutbox.status: 'pending',
+                NotificationOutbox.last_error: error,
+                NotificationOutbox.next_attempt_at: now + timedelta(seconds=delay),
+            })
+            with self._lock:
+                self.retried_count += 1
+        NotificationOutbox.query.filter_by(id=row.id).update(values, synchronize_session=False)
+
+    def run_once(self) -> int:
+        """Claim and dispatch one batch; returns the number of rows processed."""
+        with self.app.app_context():
+            try:
+                rows = self._claim_batch()
+                if not rows:
+                    return 0
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='outbox')
+                groups = _group_rows(rows)
+                for group, results in zip(groups, self._executor.map(self._dispatch, groups)):
+                    for row, (ok, error) in zip(group, results):
+                        self._record(row, ok, error)
+                db.session.commit()
+                return len(rows)
+            except Exception:
+                db.session.rollback()
+                logger.exception("Outbox batch failed")
+                return 0
+            finally:
+                db.session.remove()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if self.run_once():
+                continue
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def wake(self):
+        """Signal that new rows were committed so they are dispatched without waiting for the poll."""
+        self._wake.set()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='outbox-dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    # ----- metrics -----
+
+    def stats(self) -> dict:
+        """Queue depth by status plus dispatch counters and latency (seconds from enqueue to send)."""
+        depth = dict(
+            db.session.query(NotificationOutbox.status, db.func.count(NotificationOutbox.id))
+            .group_by(NotificationOutbox.status)
+            .all()
+        )
+        oldest = (
+            db.session.query(db.func.min(NotificationOutbox.created_at))
+            .filter(NotificationOutbox.status.in_(('pending', 'sending')))
+            .scalar()
+        )
+        with self._lock:
+            avg = self._latency_total / self.sent_count if self.sent_count else None
+            return {
+                'queue_depth': depth.get('pending', 0) + depth.get('sending', 0),
+                'by_status': depth,
+                'oldest_pending_age': (datetime.utcnow() - oldest).total_seconds() if oldest else None,
+                'sent': self.sent_count,
+                'failed': self.failed_count,
+                'retried': self.retried_count,
+                'avg_latency': round(avg, 3) if avg is not None else None,
+                'last_latency': round(self.last_latency, 3) if self.last_latency is not None else None,
+                'concurrency': self.concurrency,
+            }
+
+
+def start_outbox_worker(app) -> Optional[OutboxWorker]:
+    """Start the worker configured by NOTIFY_OUTBOX_* app config; zero workers disables it."""
+    concurrency = int(app.config.get('NOTIFY_OUTBOX_WORKERS', 8) or 0)
+    if concurrency <= 0:
+        return None
+    worker = OutboxWorker(
+        app,
+        concurrency=concurrency,
+        batch_size=int(app.config.get('NOTIFY_OUTBOX_BATCH_SIZE', 50)),
+        poll_interval=float(app.config.get('NOTIFY_OUTBOX_POLL_SECONDS', 2.0)),
+        max_attempts=int(app.config.get('NOTIFY_OUTBOX_MAX_ATTEMPTS', 5)),
+        backoff_base=float(app.config.get('NOTIFY_OUTBOX_BACKOFF_SECONDS', 30.0)),
+    )
+    worker.start()
+    return worker
@@ -1,11 +1,147 @@
 import logging
 import os
-from typing import Optional
+import threading
+import time
+from typing import Dict, List, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
+SENDGRID_DEFAULT_URL = "https://api.sendgrid.com/v3/mail/send"
+TWILIO_DEFAULT_BASE = "https://api.twilio.com"
+# SendGrid accepts at most 1000 personalizations per /v3/mail/send request
+SENDGRID_MAX_PERSONALIZATIONS = 1000
+
+
+class ProviderTransport:
+    """
+    Keep-alive HTTP transport for one notification provider.
+
+    Wraps a pooled requests.Session so repeated sends reuse TLS connections, and
+    records request latency for the provider.
+    """
+
+    def __init__(self, name: str, base_url: str, *, pool_size: int = 16, timeout: float = 10.0):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def post(self, path: str = "", **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        url = f"{self.base_url}{path}" if path else self.base_url
+        started = time.perf_counter()
+        ok = False
+        try:
+            resp = self.session.post(url, **kwargs)
+            ok = resp.status_code < 400
+            return resp
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.requests += 1
+                self.errors += 0 if ok else 1
+                self.total_seconds += elapsed
+                self.max_seconds = max(self.max_seconds, elapsed)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            avg = self.total_seconds / self.requests if self.requests else None
+            return {
+                "base_url": self.base_url,
+                "requests": self.requests,
+                "errors": self.errors,
+                "avg_latency": round(avg, 4) if avg is not None else None,
+                "max_latency": round(self.max_seconds, 4),
+            }
+
+    def close(self):
+        self.session.close()
+
+
+_transports: Dict[str, ProviderTransport] = {}
+_transports_lock = threading.Lock()
+_PROVIDER_URLS = {
+    "sendgrid": ("SENDGRID_API_URL", SENDGRID_DEFAULT_URL),
+    "twilio": ("TWILIO_API_BASE", TWILIO_DEFAULT_BASE),
+}
+
+
+def _build_transport(
+    name: str,
+    base_url: Optional[str] = None,
+    *,
+    pool_size: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> ProviderTransport:
+    env_var, default_url = _PROVIDER_URLS[name]
+    return ProviderTransport(
+        name,
+        base_url or os.environ.get(env_var) or default_url,
+        pool_size=pool_size or int(os.environ.get("NOTIFY_HTTP_POOL_SIZE", 16)),
+        timeout=timeout or float(os.environ.get("NOTIFY_HTTP_TIMEOUT", 10)),
+    )
+
+
+def configure_transports(
+    *,
+    sendgrid_url: Optional[str] = None,
+    twilio_base: Optional[str] = None,
+    pool_size: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> None:
+    """
+    (Re)build the provider transports.
+
+    Defaults come from SENDGRID_API_URL, TWILIO_API_BASE, NOTIFY_HTTP_POOL_SIZE and
+    NOTIFY_HTTP_TIMEOUT; pass arguments to point at a local stub server for benchmarks.
+    """
+    with _transports_lock:
+        for transport in _transports.values():
+            transport.close()
+        _transports.clear()
+        _transports["sendgrid"] = _build_transport("sendgrid", sendgrid_url, pool_size=pool_size, timeout=timeout)
+        _transports["twilio"] = _build_transport("twilio", twilio_base, pool_size=pool_size, timeout=timeout)
+
+
+def get_transport(name: str) -> ProviderTransport:
+    transport = _transports.get(name)
+    if transport is None:
+        # Concurrent senders may race here; only create what is missing, never replace a live transport
+        with _transports_lock:
+            transport = _transports.get(name)
+            if transport is None:
+                transport = _transports[name] = _build_transport(name)
+    return transport
+
+
+def provider_metrics() -> dict:
+    """Per-provider request counts and latency since the transports were configured."""
+    return {name: transport.metrics() for name, transport in list(_transports.items())}
+
+
+def email_configured() -> bool:
+    """True when SendGrid credentials and a sender address are present."""
+    return bool(
+        os.environ.get("SENDGRID_API_KEY")
+        and (os.environ.get("NOTIFY_EMAIL_FROM") or os.environ.get("SENDGRID_FROM_EMAIL"))
+    )
+
+
+def sms_configured() -> bool:
+    """True when Twilio credentials and a sender number are present."""
+    return all(os.environ.get(k) for k in ("TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN", "TWILIO_FROM_NUMBER"))
+
 
 def send_email_notification(
     to_email: Optional[str],
@@ -19,6 +155,7 @@ def send_email_notification(
     Send an email via SendGrid.
 
     Set SENDGRID_API_KEY and NOTIFY_EMAIL_FROM (or SENDGRID_FROM_EMAIL) in the environment.
+    Requests go through the pooled "sendgrid" transport (see configure_transports).
     """
     api_key = os.environ.get("SENDGRID_API_KEY")
     from_email = sender_email or os.environ.get("NOTIFY_EMAIL_FROM") or os.environ.get("SENDGRID_FROM_EMAIL")
@@ -36,14 +173,12 @@ def send_email_notification(
         payload["from"]["name"] = sender_name
 
     try:
-        resp = requests.post(
-            "https://api.sendgrid.com/v3/mail/send",
+        resp = get_transport("sendgrid").post(
             headers={
                 "Authorization": f"Bearer {api_key}",
                 "Content-Type": "application/json",
             },
             json=payload,
-            timeout=10,
         )
         if resp.status_code >= 400:
             logger.warning("Email notification failed (%s): %s", resp.status_code, resp.text)
@@ -54,11 +189,74 @@ def send_email_notification(
         return False
 
 
+def send_bulk_email_notification(
+    recipients: List[dict],
+    subject: str,
+    content: str,
+    *,
+    sender_email: Optional[str] = None,
+    sender_name: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+) -> List[bool]:
+    """
+    Send one templated email to many recipients with as few SendGrid calls as possible.
+
+    Each recipient is ``{"email": ..., "substitutions": {"-key-": "value"}}``; substitution
+    keys are replaced by SendGrid in the subject and content for that recipient only.
+    Recipients are grouped into personalizations, chunked by NOTIFY_EMAIL_BATCH_SIZE
+    (capped at SendGrid's limit). Returns one success flag per recipient, in order.
+    """
+    api_key = os.environ.get("SENDGRID_API_KEY")
+    from_email = sender_email or os.environ.get("NOTIFY_EMAIL_FROM") or os.environ.get("SENDGRID_FROM_EMAIL")
+    results = [False] * len(recipients)
+    if not api_key or not from_email:
+        logger.info("Bulk email notification skipped (missing config). recipients=%s", len(recipients))
+        return results
+
+    limit = chunk_size or int(os.environ.get("NOTIFY_EMAIL_BATCH_SIZE", SENDGRID_MAX_PERSONALIZATIONS))
+    limit = max(1, min(limit, SENDGRID_MAX_PERSONALIZATIONS))
+    indexed = [(i, r) for i, r in enumerate(recipients) if r.get("email")]
+    for start in range(0, len(indexed), limit):
+        chunk = indexed[start:start + limit]
+        personalizations = []
+        for _, recipient in chunk:
+            item = {"to": [{"email": recipient["email"]}]}
+            if recipient.get("substitutions"):
+                item["substitutions"] = {k: str(v) for k, v in recipient["substitutions"].items()}
+            personalizations.append(item)
+        payload = {
+            "from": {"email": from_email},
+            "personalizations": personalizations,
+            "subject": subject,
+            "content": [{"type": "text/plain", "value": content}],
+        }
+        if sender_name:
+            payload["from"]["name"] = sender_name
+        try:
+            resp = get_transport("sendgrid").post(
+                headers={
+                    "Authorization": f"Bearer {api_key}",
+                    "Content-Type": "application/json",
+                },
+                json=payload,
+            )
+            if resp.status_code >= 400:
+                logger.warning("Bulk email notification failed (%s): %s", resp.status_code, resp.text)
+                continue
+        except Exception:
+            logger.exception("Bulk email notification error for %s recipient(s)", len(chunk))
+            continue
+        for i, _ in chunk:
+            results[i] = True
+    return results
+
+
 def send_sms_notification(to_number: Optional[str], message: str, *, sender_number: Optional[str] = None) -> bool:
     """
     Send an SMS via Twilio.
 
     Set TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, and TWILIO_FROM_NUMBER in the environment.
+    Requests go through the pooled "twilio" transport (see configure_transports).
     """
     account_sid = os.environ.get("TWILIO_ACCOUNT_SID")
     auth_token = os.environ.get("TWILIO_AUTH_TOKEN")
@@ -68,17 +266,16 @@ def send_sms_notification(to_number: Optional[str], message: str, *, sender_numb
         logger.info("SMS notification skipped (missing config or recipient). to=%s", to_number)
         return False
 
-    url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json"
+    path = f"/2010-04-01/Accounts/{account_sid}/Messages.json"
     try:
-        resp = requests.post(
-            url,
+        resp = get_transport("twilio").post(
+            path,
             data={
                 "From": from_number,
                 "To": to_number,
                 "Body": message,
             },
             auth=(account_sid, auth_token),
-            timeout=10,
         )
         if resp.status_code >= 400:
             logger.warning("SMS notification failed (%s): %s", resp.status_code, resp.text)
@@ -0,0 +1,166 @@
+"""
+Project tree queries and the cached tree snapshot.
+
+Nodes only store ``parent_id``; subtrees and ancestor chains are resolved in SQL with
+recursive CTEs, so deleting, fetching or checking a branch takes a fixed number of
+statements however deep or wide it is. Unbounded CTEs use UNION rather than UNION ALL
+so a cycle already present in the data terminates instead of recursing forever; the
+level-limited ones (``levels_query``, ``ancestor_paths``) stop at their depth instead.
+
+``snapshot`` serves the whole forest as pre-serialized JSON. It is rebuilt only after
+``invalidate`` bumps the process-local version (call it after committing any change
+that shows up in the tree) or once it is older than ``max_age`` seconds, which bounds
+how long edits made by other processes stay invisible.
+"""
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import joinedload, lazyload, selectinload
+
+from models import db, ProjectNode, ProjectNodeAssignee
+from versioned_snapshot import VersionedSnapshot
+
+# Cap on levels walked by ancestor_paths (and the lazy tree API), so cyclic data cannot recurse forever
+MAX_DEPTH = 64
+
+
+def subtree_ids(root_id: int):
+    """Recursive CTE with one ``id`` row for ``root_id`` and each of its descendants."""
+    tree = db.select(ProjectNode.id).where(ProjectNode.id == root_id).cte('subtree', recursive=True)
+    return tree.union(db.select(ProjectNode.id).where(ProjectNode.parent_id == tree.c.id))
+
+
+def ancestor_ids(node_id: int):
+    """Recursive CTE with one ``id`` row for ``node_id`` and each node above it."""
+    chain = (
+        db.select(ProjectNode.id, ProjectNode.parent_id)
+        .where(ProjectNode.id == node_id)
+        .cte('ancestors', recursive=True)
+    )
+    return chain.union(
+        db.select(ProjectNode.id, ProjectNode.parent_id).where(ProjectNode.id == chain.c.parent_id)
+    )
+
+
+def subtree_query(root_id: int):
+    """Query for ``root_id`` and all of its descendants."""
+    return ProjectNode.query.filter(ProjectNode.id.in_(db.select(subtree_ids(root_id).c.id)))
+
+
+def is_within(node_id: int, root_id: int) -> bool:
+    """True when ``node_id`` is ``root_id`` or one of its descendants (one query)."""
+    chain = ancestor_ids(node_id)
+    return bool(db.session.scalar(db.select(db.exists().where(chain.c.id == root_id))))
+
+
+def delete_subtree(root_id: int) -> None:
+    """Delete a node, its descendants and their assignee links (sqlite3 reports no rowcount for these)."""
+    ids = db.select(subtree_ids(root_id).c.id)
+    ProjectNodeAssignee.query.filter(ProjectNodeAssignee.node_id.in_(ids)).delete(synchronize_session=False)
+    ProjectNode.query.filter(ProjectNode.id.in_(ids)).delete(synchronize_session=False)
+
+
+def levels_query(parent_id: Optional[int], depth: int):
+    """Query for the ``depth`` levels below ``parent_id`` (None = main trunks), in one recursive CTE."""
+    start = ProjectNode.parent_id.is_(None) if parent_id is None else ProjectNode.parent_id == parent_id
+    levels = db.select(ProjectNode.id, db.literal(1).label('level')).where(start).cte('levels', recursive=True)
+    levels = levels.union_all(
+        db.select(ProjectNode.id, levels.c.level + 1).where(ProjectNode.parent_id == levels.c.id, levels.c.level < depth)
+    )
+    return ProjectNode.query.filter(ProjectNode.id.in_(db.select(levels.c.id)))
+
+
+def search_query(term: str):
+    """Nodes whose name starts with ``term`` (case-insensitive), served by ix_project_nodes_name_lower."""
+    prefix = term.lower()
+    name = db.func.lower(ProjectNode.name)
+    return ProjectNode.query.filter(name >= prefix, name < prefix + chr(0x10FFFF)).order_by(name.asc(), ProjectNode.id.asc())
+
+
+def ancestor_paths(node_ids) -> Dict[int, List[int]]:
+    """Ancestor ids from the main trunk down to the parent, for each node id (one query)."""
+    ids = list(node_ids)
+    if not ids:
+        return {}
+    chain = (
+        db.select(ProjectNode.id.label('node_id'), ProjectNode.parent_id.label('ancestor_id'), db.literal(1).label('up'))
+        .where(ProjectNode.id.in_(ids), ProjectNode.parent_id.isnot(None))
+        .cte('chain', recursive=True)
+    )
+    chain = chain.union_all(
+        db.select(chain.c.node_id, ProjectNode.parent_id, chain.c.up + 1).where(
+            ProjectNode.id == chain.c.ancestor_id, ProjectNode.parent_id.isnot(None), chain.c.up < MAX_DEPTH,
+        )
+    )
+    paths: Dict[int, List[int]] = {node_id: [] for node_id in ids}
+    rows = db.session.execute(db.select(chain.c.node_id, chain.c.ancestor_id).order_by(chain.c.node_id, chain.c.up.desc()))
+    for node_id, ancestor_id in rows:
+        paths[node_id].append(ancestor_id)
+    return paths
+
+
+def child_count_map(node_ids) -> Dict[int, int]:
+    """Number of children per node id, counted in one grouped query."""
+    ids = list(node_ids)
+    if not ids:
+        return {}
+    rows = (
+        db.session.query(ProjectNode.parent_id, db.func.count(ProjectNode.id))
+        .filter(ProjectNode.parent_id.in_(ids))
+        .group_by(ProjectNode.parent_id)
+    )
+    return dict(rows.all())
+
+
+def node_payloads(query) -> List[dict]:
+    """Serialize the nodes of a query with their child counts in a fixed number of queries."""
+    nodes = with_node_relations(query).order_by(None).order_by(ProjectNode.parent_id.asc(), ProjectNode.name.asc()).all()
+    counts = child_count_map(n.id for n in nodes)
+    return [dict(node.to_dict(), child_count=counts.get(node.id, 0)) for node in nodes]
+
+
+def child_counts(nodes) -> Dict[int, int]:
+    """Number of children per node id, computed from the ``parent_id`` of the given nodes."""
+    counts: Dict[int, int] = {}
+    for node in nodes:
+        if node.parent_id is not None:
+            counts[node.parent_id] = counts.get(node.parent_id, 0) + 1
+    return counts
+
+
+def with_node_relations(query):
+    """Eager-load everything ``ProjectNode.to_dict`` touches."""
+    return query.options(
+        selectinload(ProjectNode.assignee_links).joinedload(ProjectNodeAssignee.user),
+        joinedload(ProjectNode.researcher),
+        lazyload(ProjectNode.assignees),
+    )
+
+
+@dataclass(frozen=True)
+class TreeSnapshot:
+    body: bytes
+    etag: str
+
+
+def _build() -> TreeSnapshot:
+    nodes = with_node_relations(ProjectNode.query).order_by(ProjectNode.parent_id.asc(), ProjectNode.name.asc()).all()
+    counts = child_counts(nodes)
+    payload = [dict(node.to_dict(), child_count=counts.get(node.id, 0)) for node in nodes]
+    body = json.dumps(payload, separators=(',', ':')).encode()
+    return TreeSnapshot(body, hashlib.sha1(body).hexdigest())
+
+
+_snapshot = VersionedSnapshot(_build)
+
+
+def invalidate() -> None:
+    """Mark the cached snapshot stale after a committed change to nodes, assignees or their users."""
+    _snapshot.invalidate()
+
+
+def snapshot(max_age: float) -> TreeSnapshot:
+    """Current tree snapshot, rebuilt from the database only when stale."""
+    return _snapshot.get(max_age)
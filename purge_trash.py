@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+"""Script to permanently delete trashed mails past the retention window."""
+
+import argparse
+from app import app
+from mail_retention import purge_deleted_mails
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=app.config['MAIL_RETENTION_DAYS'],
+                        help='Delete mails trashed more than this many days ago.')
+    parser.add_argument('--batch-size', type=int, default=app.config['MAIL_RETENTION_BATCH_SIZE'],
+                        help='Number of mails deleted per transaction.')
+    args = parser.parse_args()
+
+    with app.app_context():
+        removed = purge_deleted_mails(args.days, args.batch_size)
+    print(f"✓ Purged {removed} trashed mail(s) older than {args.days} days")
+
+
+if __name__ == '__main__':
+    main()
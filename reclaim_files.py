@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+"""Script to unlink upload files queued for reclaim by deletions."""
+
+import argparse
+from app import app
+from file_reclaim import reclaim_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch-size', type=int, default=app.config['FILE_RECLAIM_BATCH_SIZE'],
+                        help='Number of queue entries handled per transaction.')
+    args = parser.parse_args()
+
+    with app.app_context():
+        reclaimed = reclaim_files(app.config['UPLOAD_FOLDER'], args.batch_size,
+                                  app.config['FILE_RECLAIM_MAX_ATTEMPTS'])
+    print(f"✓ Reclaimed {reclaimed} orphaned upload file(s)")
+
+
+if __name__ == '__main__':
+    main()
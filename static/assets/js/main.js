@@ -666,6 +666,65 @@
     return calendars;
   };
 
+  // While the event stream is up, pollers still run this often to catch events it missed
+  const LIVE_SAFETY_POLL_MS = 60000;
+
+  /**
+   * Server-Sent Events push channel (/api/events). While connected, pollers slow
+   * down to LIVE_SAFETY_POLL_MS and pages refresh when the server pushes a change.
+   * Every (re)connect runs the `resync` callbacks, since events published while
+   * the stream was down (or dropped by the server) are never replayed.
+   */
+  const liveEvents = {
+    source: null,
+    connected: false,
+    handlers: {},
+    resyncs: [],
+    resync(fn) {
+      this.resyncs.push(fn);
+    },
+    // Run fn every intervalMs while disconnected, every LIVE_SAFETY_POLL_MS while connected
+    poll(fn, intervalMs) {
+      let lastRun = Date.now();
+      return setInterval(() => {
+        if (this.connected && Date.now() - lastRun < LIVE_SAFETY_POLL_MS) return;
+        lastRun = Date.now();
+        fn();
+      }, intervalMs);
+    },
+    on(type, handler) {
+      if (!this.handlers[type]) {
+        this.handlers[type] = [];
+        if (this.source) this.bind(type);
+      }
+      this.handlers[type].push(handler);
+    },
+    bind(type) {
+      this.source.addEventListener(type, (evt) => {
+        let data = {};
+        try {
+          data = JSON.parse(evt.data || "{}");
+        } catch (err) {
+          /* ignore malformed payloads */
+        }
+        (this.handlers[type] || []).forEach((fn) => fn(data));
+      });
+    },
+    start() {
+      if (this.source || typeof EventSource === "undefined") return;
+      if (!document.querySelector(".btn-mail, .chat-link, .chat-page, #taskGlobals")) return;
+      this.source = new EventSource("/api/events");
+      Object.keys(this.handlers).forEach((type) => this.bind(type));
+      this.source.addEventListener("open", () => {
+        this.connected = true;
+        this.resyncs.forEach((fn) => fn());
+      });
+      this.source.addEventListener("error", () => {
+        this.connected = false;
+      });
+    },
+  };
+
   let chatUnreadTimer = null;
   const fetchChatUnread = async () => {
     const badgeEls = document.querySelectorAll(".chat-link .btn-mail__badge");
@@ -732,7 +791,11 @@
 
     let currentTarget = "group";
     let lastId = null;
-    let poller = null;
+    // Oldest rendered message; scrolling to the top pages back from it (into the archive)
+    let firstId = null;
+    let historyDone = false;
+    let loadingOlder = false;
+    const CHAT_PAGE_SIZE = 200;
 
     const labelFor = (target) => {
       if (target === "group") {
@@ -742,6 +805,34 @@
       return { title: `گفتگو با ${name}`, subtitle: "پیام خصوصی" };
     };
 
+    const buildMessageItem = (m) => {
+      const item = document.createElement("div");
+      item.className = `chat-msg${m.is_mine ? " chat-msg--mine" : ""}`;
+      const author = document.createElement("div");
+      author.className = "chat-msg__meta";
+      author.textContent = m.is_mine ? "شما" : m.sender_name || "کاربر";
+      const body = document.createElement("div");
+      body.className = "chat-msg__body";
+      body.textContent = m.body;
+      item.append(author, body);
+      if (m.can_delete) {
+        const actions = document.createElement("div");
+        actions.className = "chat-msg__actions";
+        const delBtn = document.createElement("button");
+        delBtn.type = "button";
+        delBtn.className = "chat-msg__delete";
+        delBtn.textContent = "حذف";
+        delBtn.addEventListener("click", async () => {
+          const ok = confirm("این پیام حذف شود؟");
+          if (!ok) return;
+          await deleteMessage(m.id);
+        });
+        actions.appendChild(delBtn);
+        item.appendChild(actions);
+      }
+      return item;
+    };
+
     const renderMessages = (msgs, append = false) => {
       if (!messagesBox) return;
       if (!append) messagesBox.innerHTML = "";
@@ -752,36 +843,20 @@
       if (append && msgs.length) {
         messagesBox.querySelectorAll(".chat-empty").forEach((n) => n.remove());
       }
-      msgs.forEach((m) => {
-        const item = document.createElement("div");
-        item.className = `chat-msg${m.is_mine ? " chat-msg--mine" : ""}`;
-        const author = document.createElement("div");
-        author.className = "chat-msg__meta";
-        author.textContent = m.is_mine ? "شما" : m.sender_name || "کاربر";
-        const body = document.createElement("div");
-        body.className = "chat-msg__body";
-        body.textContent = m.body;
-        item.append(author, body);
-        if (m.can_delete) {
-          const actions = document.createElement("div");
-          actions.className = "chat-msg__actions";
-          const delBtn = document.createElement("button");
-          delBtn.type = "button";
-          delBtn.className = "chat-msg__delete";
-          delBtn.textContent = "حذف";
-          delBtn.addEventListener("click", async () => {
-            const ok = confirm("این پیام حذف شود؟");
-            if (!ok) return;
-            await deleteMessage(m.id);
-          });
-          actions.appendChild(delBtn);
-          item.appendChild(actions);
-        }
-        messagesBox.appendChild(item);
-      });
+      msgs.forEach((m) => messagesBox.appendChild(buildMessageItem(m)));
       messagesBox.scrollTop = messagesBox.scrollHeight;
     };
 
+    const prependMessages = (msgs) => {
+      if (!messagesBox || !msgs.length) return;
+      messagesBox.querySelectorAll(".chat-empty").forEach((n) => n.remove());
+      const prevHeight = messagesBox.scrollHeight;
+      const fragment = document.createDocumentFragment();
+      msgs.forEach((m) => fragment.appendChild(buildMessageItem(m)));
+      messagesBox.insertBefore(fragment, messagesBox.firstChild);
+      messagesBox.scrollTop += messagesBox.scrollHeight - prevHeight;
+    };
+
     const refreshUnread = async () => {
       try {
         const res = await fetch("/api/chat/unread", { cache: "no-cache" });
@@ -805,24 +880,79 @@
       }
     };
 
-    const loadMessages = async (initial = false) => {
+    // Resolves to false on failure; `wait` turns the request into a long-poll (seconds)
+    const loadMessages = async (initial = false, wait = 0) => {
+      const target = currentTarget;
       const url = new URL("/api/chat/messages", window.location.origin);
-      url.searchParams.set("target", currentTarget);
-      if (lastId) url.searchParams.set("after", lastId);
+      url.searchParams.set("target", target);
+      if (lastId || wait) url.searchParams.set("after", lastId || 0);
+      if (wait) url.searchParams.set("wait", wait);
       url.searchParams.set("mark_read", "1");
       try {
         const res = await fetch(url.toString(), { cache: "no-cache" });
-        if (!res.ok) return;
-        const data = await res.json();
+        if (!res.ok) return false;
+        if (target !== currentTarget) return true;
+        // A long-poll may return messages already rendered meanwhile (e.g. our own send)
+        const data = (await res.json()).filter((m) => !lastId || m.id > lastId);
         if (data.length) {
+          if (initial || firstId === null) {
+            firstId = data[0].id;
+            historyDone = data.length < CHAT_PAGE_SIZE;
+          }
           lastId = data[data.length - 1].id;
           renderMessages(data, true);
         } else if (initial) {
           renderMessages([], false);
         }
-        await refreshUnread();
+        if (data.length || initial) await refreshUnread();
+        return true;
       } catch (err) {
         console.warn("Chat load failed", err);
+        return false;
+      }
+    };
+
+    const loadOlder = async () => {
+      if (historyDone || loadingOlder || !firstId) return;
+      loadingOlder = true;
+      const target = currentTarget;
+      const url = new URL("/api/chat/messages", window.location.origin);
+      url.searchParams.set("target", target);
+      url.searchParams.set("before", firstId);
+      url.searchParams.set("mark_read", "0");
+      try {
+        const res = await fetch(url.toString(), { cache: "no-cache" });
+        if (!res.ok || target !== currentTarget) return;
+        const data = await res.json();
+        if (data.length < CHAT_PAGE_SIZE) historyDone = true;
+        if (data.length) {
+          firstId = data[0].id;
+          prependMessages(data);
+        }
+      } catch (err) {
+        console.warn("Chat history load failed", err);
+      } finally {
+        loadingOlder = false;
+      }
+    };
+    messagesBox?.addEventListener("scroll", () => {
+      if (messagesBox.scrollTop < 40) loadOlder();
+    });
+
+    const CHAT_LONG_POLL_SECONDS = 25;
+    let pollGeneration = 0;
+    const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+    // Without the SSE stream, wait on the server for new messages instead of polling every few seconds
+    const longPoll = async (generation) => {
+      let lastFetch = Date.now();
+      while (generation === pollGeneration) {
+        if (liveEvents.connected && Date.now() - lastFetch < LIVE_SAFETY_POLL_MS) {
+          await sleep(5000);
+          continue;
+        }
+        lastFetch = Date.now();
+        const ok = await loadMessages(false, liveEvents.connected ? 0 : CHAT_LONG_POLL_SECONDS);
+        if (!ok) await sleep(5000);
       }
     };
 
@@ -843,12 +973,14 @@
       }
     };
 
-    const resetAndLoad = () => {
+    const resetAndLoad = async () => {
       lastId = null;
+      firstId = null;
+      historyDone = false;
       renderMessages([], false);
-      loadMessages(true);
-      if (poller) clearInterval(poller);
-      poller = setInterval(() => loadMessages(false), 5000);
+      const generation = ++pollGeneration;
+      await loadMessages(true);
+      longPoll(generation);
     };
 
     const activateTarget = (target) => {
@@ -873,6 +1005,31 @@
       });
     });
 
+    const isCurrentConversation = (msg) => {
+      if (currentTarget === "group") return msg.recipient_id == null;
+      return (
+        msg.recipient_id != null &&
+        (String(msg.sender_id) === currentTarget ||
+          String(msg.recipient_id) === currentTarget)
+      );
+    };
+    liveEvents.on("chat", (msg) => {
+      if (!isCurrentConversation(msg)) {
+        refreshUnread();
+      } else if (msg.deleted) {
+        resetAndLoad();
+      } else {
+        loadMessages(false);
+      }
+    });
+    liveEvents.on("unread", (data) => {
+      if (data.channel === "chat") refreshUnread();
+    });
+    liveEvents.resync(() => {
+      loadMessages(false);
+      refreshUnread();
+    });
+
     const params = new URLSearchParams(window.location.search);
     const initialTarget = params.get("target");
     const activated =
@@ -1601,6 +1758,8 @@
   const taskStore = {
     list: [],
     map: {},
+    feedToken: "",
+    feedEtag: null,
     calendars: [],
     isAdmin: false,
     currentUserId: null,
@@ -1892,9 +2051,14 @@
     selected: new Set(),
     currentMailId: null,
     mails: [],
+    nextCursor: null,
+    bodies: new Map(),
     seenMailIds: new Set(),
   };
 
+  const MAIL_PAGE_SIZE = 50;
+  const MAIL_PAGE_MAX = 200;
+
   const renderMailBadge = (count) => {
     const btn = document.querySelector(".btn-mail");
     const badge = document.querySelector(".btn-mail__badge");
@@ -1927,7 +2091,7 @@
     const title = document.createElement("strong");
     title.textContent = mail.subject || "New mail";
     const snippet = document.createElement("p");
-    snippet.textContent = (mail.body || "").slice(0, 80);
+    snippet.textContent = `From: ${mail.sender || "System"}`;
 
     const actions = document.createElement("div");
     actions.className = "mail-toast__actions";
@@ -2011,11 +2175,18 @@
   };
 
   const mailApi = {
-    async list(folder = "inbox") {
-      const res = await fetch(`/api/mails?folder=${folder}`, { credentials: "same-origin" });
+    async list(folder = "inbox", { before = null, limit = MAIL_PAGE_SIZE } = {}) {
+      const params = new URLSearchParams({ folder, limit: String(limit) });
+      if (before) params.set("before", before);
+      const res = await fetch(`/api/mails?${params}`, { credentials: "same-origin" });
       if (!res.ok) throw new Error("Mail list failed");
       return res.json();
     },
+    async get(id) {
+      const res = await fetch(`/api/mails/${id}`, { credentials: "same-origin" });
+      if (!res.ok) throw new Error("Mail fetch failed");
+      return res.json();
+    },
     async markRead(ids) {
       await fetch(`/api/mails/bulk`, {
         method: "POST",
@@ -2093,7 +2264,7 @@
       subj.textContent = mail.subject;
       const snippet = document.createElement("div");
       snippet.className = "mailbox__snippet";
-      snippet.textContent = (mail.body || "").slice(0, 80);
+      snippet.textContent = mail.sender || "System";
       const date = document.createElement("div");
       date.className = "mailbox__date";
       const jalali = formatJalaliDate((mail.created_at || "").slice(0, 10));
@@ -2123,6 +2294,28 @@
       }
       list.appendChild(item);
     });
+    if (mailUiState.nextCursor) {
+      const more = document.createElement("button");
+      more.type = "button";
+      more.className = "ghost-btn mailbox__more";
+      more.textContent = "Load older mails";
+      more.addEventListener("click", () => loadMoreMails(more));
+      list.appendChild(more);
+    }
+  };
+
+  const loadMoreMails = async (btn) => {
+    if (!mailUiState.nextCursor) return;
+    btn.disabled = true;
+    try {
+      const page = await mailApi.list(mailUiState.folder, { before: mailUiState.nextCursor });
+      const known = new Set(mailUiState.mails.map((m) => m.id));
+      mailUiState.mails = mailUiState.mails.concat(page.items.filter((m) => !known.has(m.id)));
+      mailUiState.nextCursor = page.next_cursor;
+      renderMailList(mailUiState.mails);
+    } catch (err) {
+      btn.disabled = false;
+    }
   };
 
   const openMailDetail = async (mail) => {
@@ -2137,9 +2330,21 @@
       ? `تاریخ ثبت: ${jalaliDate}`
       : (mail.created_at || "").replace("T", " ").slice(0, 16);
     meta.textContent = `${mail.sender || "System"} • ${dateText}`;
-    body.textContent = mail.body;
     detail.hidden = false;
     mailUiState.currentMailId = mail.id;
+    // List rows carry no body; fetch it once per mail (bodies never change)
+    if (!mailUiState.bodies.has(mail.id)) {
+      body.textContent = "Loading…";
+      try {
+        const full = await mailApi.get(mail.id);
+        mailUiState.bodies.set(mail.id, full.body);
+      } catch (err) {
+        if (mailUiState.currentMailId === mail.id) body.textContent = "Could not load this mail.";
+        return;
+      }
+    }
+    if (mailUiState.currentMailId !== mail.id) return;
+    body.textContent = mailUiState.bodies.get(mail.id);
     if (!mail.is_read) {
       await mailApi.markRead([mail.id]);
       mail.is_read = true;
@@ -2161,8 +2366,12 @@
       const currentIndex = mailUiState.currentMailId
         ? prevIds.indexOf(mailUiState.currentMailId)
         : -1;
-      const mails = await mailApi.list(mailUiState.folder);
+      // Reload as many rows as are already shown so "load older" pages survive a refresh
+      const limit = Math.min(Math.max(prevMails.length, MAIL_PAGE_SIZE), MAIL_PAGE_MAX);
+      const page = await mailApi.list(mailUiState.folder, { limit });
+      const mails = page.items;
       mailUiState.mails = mails;
+      mailUiState.nextCursor = page.next_cursor;
       if (mailUiState.folder === "inbox") {
         mails.forEach((m) => {
           if (!mailUiState.seenMailIds.has(m.id)) {
@@ -2225,6 +2434,8 @@
     navBtns.forEach((btn) => {
       btn.addEventListener("click", () => {
         mailUiState.folder = btn.dataset.folder;
+        mailUiState.mails = [];
+        mailUiState.nextCursor = null;
         refreshMails();
         highlightActiveFolder();
       });
@@ -2319,10 +2530,12 @@
         alert("Could not send mail.");
       }
     });
-    mailUiState.polls = setInterval(() => {
+    mailUiState.polls = liveEvents.poll(() => {
       refreshMails(false);
       fetchUnreadMailCount();
     }, 10000);
+    liveEvents.on("mail", () => refreshMails(false));
+    liveEvents.resync(() => refreshMails(false));
     const params = new URLSearchParams(window.location.search || "");
     const openId = Number(params.get("open"));
     if (openId) mailUiState.currentMailId = openId;
@@ -2356,17 +2569,39 @@
     subset.forEach((task) => container.appendChild(renderTaskRow(task, opts)));
   };
 
+  // Incremental feed: resolves to the updated task list, or null when nothing changed (304)
   const fetchTasks = async (isAdmin) => {
-    const res = await fetch(`/api/tasks${isAdmin ? "?all=1" : ""}`, {
+    const params = new URLSearchParams({ since: taskStore.feedToken });
+    if (isAdmin) params.set("all", "1");
+    const headers = taskStore.feedEtag ? { "If-None-Match": taskStore.feedEtag } : {};
+    const res = await fetch(`/api/tasks?${params}`, {
       credentials: "same-origin",
-      cache: "no-cache",
+      cache: "no-store",
+      headers,
     });
     if (res.status === 401) {
       window.location.href = "/login";
       return [];
     }
+    if (res.status === 304) return null;
     if (!res.ok) throw new Error("Failed to load tasks");
-    return await res.json();
+    const data = await res.json();
+    taskStore.feedToken = data.token || "";
+    taskStore.feedEtag = res.headers.get("ETag");
+    if (data.full) return data.tasks;
+    const removed = new Set(data.removed || []);
+    const changed = new Map((data.changed || []).map((t) => [t.id, t]));
+    const merged = taskStore.list
+      .filter((t) => !removed.has(t.id) || changed.has(t.id))
+      .map((t) => changed.get(t.id) || t);
+    const known = new Set(merged.map((t) => t.id));
+    changed.forEach((t, id) => {
+      if (!known.has(id)) merged.push(t);
+    });
+    // Same order as full loads: the group's earliest due date, then id
+    return merged.sort((a, b) =>
+      a.first_due < b.first_due ? -1 : a.first_due > b.first_due ? 1 : a.id - b.id
+    );
   };
 
   const updateTaskStatus = async (taskId, status) => {
@@ -2431,6 +2666,7 @@
     if (!panels.length) return;
     try {
       const tasks = await fetchTasks(taskStore.isAdmin);
+      if (tasks === null) return;
       taskStore.list = tasks;
       taskStore.map = buildTaskMap(tasks);
       panels.forEach((panel) =>
@@ -2463,6 +2699,7 @@
       });
       ensureCalendars(taskStore.map);
     } catch (err) {
+      taskStore.feedEtag = null;
       panels.forEach((panel) => {
         panel.innerHTML = `<p class="empty-state">Could not load tasks.</p>`;
       });
@@ -2922,6 +3159,8 @@
     adminPanel: null,
     assignees: [],
     canEdit: false,
+    // Viewers load two levels at a time and expand deeper branches on demand
+    lazy: false,
   };
 
   const getSelectedAssigneeIds = (select) =>
@@ -3351,6 +3590,18 @@
         if (node.children && node.children.length) {
           li.appendChild(renderList(node.children, false));
         }
+        const hidden = (Number(node.child_count) || 0) - (node.children?.length || 0);
+        if (hidden > 0) {
+          const moreBtn = document.createElement("button");
+          moreBtn.type = "button";
+          moreBtn.className = "tree-action tree-node__expand";
+          moreBtn.textContent = `نمایش شاخه‌ها (${hidden})`;
+          moreBtn.addEventListener("click", () => {
+            moreBtn.disabled = true;
+            expandProjectNode(node.id);
+          });
+          li.appendChild(moreBtn);
+        }
         ul.appendChild(li);
       });
       return ul;
@@ -3371,11 +3622,27 @@
     projectTreeStore.container.appendChild(renderList(roots, true));
   };
 
+  const expandProjectNode = async (nodeId) => {
+    try {
+      const res = await fetch(`/api/project-tree?parent_id=${nodeId}&depth=2`);
+      // Fall through to the re-render so the expand button is enabled again
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      const data = await res.json();
+      const merged = new Map(projectTreeStore.nodes.map((n) => [Number(n.id), n]));
+      (Array.isArray(data) ? data : []).forEach((n) => merged.set(Number(n.id), n));
+      projectTreeStore.nodes = Array.from(merged.values());
+    } catch (err) {
+      console.error("Failed to expand project node", err);
+    }
+    renderProjectTree();
+  };
+
   const loadProjectTree = async () => {
     if (!projectTreeStore.container) return;
     projectTreeStore.container.innerHTML = '<p class="empty-state">Loading project map…</p>';
     try {
-      const res = await fetch("/api/project-tree");
+      // Editors need every node for the parent pickers; viewers start with the top two levels
+      const res = await fetch(projectTreeStore.lazy ? "/api/project-tree?depth=2" : "/api/project-tree");
       let data = [];
       if (res.ok) {
         data = await res.json();
@@ -3513,6 +3780,7 @@
     projectTreeStore.container = container;
     projectTreeStore.canEdit =
       container.dataset.treeCanEdit === "1" || container.dataset.treeCanEdit === "true";
+    projectTreeStore.lazy = !projectTreeStore.canEdit;
     projectTreeStore.adminPanel = document.querySelector("[data-project-tree-admin]");
     projectTreeStore.assignees = treeAssigneesFromDom();
     if (projectTreeStore.canEdit) {
@@ -3546,10 +3814,21 @@
     initManageUsersPage();
     initProfilePage();
     initPasswordVisibility();
+    liveEvents.start();
     fetchUnreadMailCount();
     fetchChatUnread();
     if (chatUnreadTimer) clearInterval(chatUnreadTimer);
-    chatUnreadTimer = setInterval(fetchChatUnread, 10000);
+    chatUnreadTimer = liveEvents.poll(fetchChatUnread, 10000);
+    liveEvents.resync(() => {
+      fetchUnreadMailCount();
+      fetchChatUnread();
+    });
+    liveEvents.on("mail", () => fetchUnreadMailCount());
+    liveEvents.on("unread", (data) => {
+      if (data.channel === "mail") fetchUnreadMailCount();
+      if (data.channel === "chat") fetchChatUnread();
+    });
+    liveEvents.on("chat", () => fetchChatUnread());
     const initTaskTabs = () => {
       document.querySelectorAll(".tasks-tabs").forEach((tabBar) => {
         const card = tabBar.closest(".tasks-side-card") || tabBar.parentElement;
@@ -3600,7 +3879,9 @@
     // Render calendars immediately (even if tasks API fails) then hydrate with tasks data
     ensureCalendars(taskStore.map);
     reloadTasks();
-    setInterval(reloadTasks, 10000);
+    liveEvents.poll(reloadTasks, 10000);
+    liveEvents.on("task", () => reloadTasks());
+    liveEvents.resync(reloadTasks);
   });
   /**
    * Animation on scroll
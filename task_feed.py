@@ -0,0 +1,128 @@
+"""
+Dashboard task feed.
+
+``collapse_recurrences`` reduces a task query to one row per recurrence group.
+``fingerprint`` summarises a user's task list in one aggregate query and backs the
+``/api/tasks`` ETag, so an unchanged poll is answered with 304 before any task is
+loaded. ``changes_since`` answers ``since`` polls with the tasks changed after a
+token plus the ids that left the list. Deletions are read from ``TaskTombstone``
+rows written by ``record_deleted``; callers are responsible for committing.
+"""
+import hashlib
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import or_
+
+from models import db, Task, TaskAttachment, TaskTombstone
+
+# Tokens are backdated so rows committed by a transaction still in flight when the
+# token was issued are picked up by the next poll; re-sending a task is harmless.
+TOKEN_SKEW = timedelta(seconds=5)
+TOMBSTONE_RETENTION = timedelta(hours=24)
+
+
+def collapse_recurrences(query, today: date):
+    """
+    Reduce a task query to one row per recurrence group, chosen in SQL with window functions:
+    the nearest occurrence due today or later, else the earliest one. Non-recurring tasks are
+    their own group. Groups are ordered by their earliest due date (loaded into
+    ``Task.first_due``), then id.
+    """
+    partition = (Task.recurrence_group_id, db.case((Task.recurrence_group_id.is_(None), Task.id), else_=0))
+    rank = db.func.row_number().over(
+        partition_by=partition,
+        order_by=(db.case((Task.due_date >= today, 0), else_=1), Task.due_date.asc(), Task.id.asc()),
+    )
+    first_due = db.func.min(Task.due_date).over(partition_by=partition)
+    ranked = query.with_entities(Task.id.label('id'), rank.label('rank'), first_due.label('first_due')).subquery()
+    return (
+        Task.query.join(ranked, Task.id == ranked.c.id)
+        .filter(ranked.c.rank == 1)
+        .options(db.with_expression(Task.first_due, ranked.c.first_due))
+        .order_by(ranked.c.first_due.asc(), Task.id.asc())
+    )
+
+
+def _prune_tombstones(now: datetime) -> None:
+    TaskTombstone.query.filter(TaskTombstone.deleted_at < now - TOMBSTONE_RETENTION).delete(
+        synchronize_session=False
+    )
+
+
+def record_deleted(tasks: Iterable[Task]) -> None:
+    """Add tombstones for tasks being deleted and drop ones older than the retention window."""
+    now = datetime.utcnow()
+    db.session.add_all(
+        TaskTombstone(task_id=t.id, recurrence_group_id=t.recurrence_group_id, deleted_at=now) for t in tasks
+    )
+    _prune_tombstones(now)
+
+
+def record_deleted_where(criterion) -> None:
+    """Set-based ``record_deleted`` for every task matching ``criterion``, without loading them."""
+    now = datetime.utcnow()
+    rows = db.select(Task.id, Task.recurrence_group_id, db.literal(now, db.DateTime)).where(criterion)
+    db.session.execute(
+        TaskTombstone.__table__.insert().from_select(['task_id', 'recurrence_group_id', 'deleted_at'], rows)
+    )
+    _prune_tombstones(now)
+
+
+def fingerprint(query, today: date, *parts) -> str:
+    """Strong ETag for a scoped task list; ``parts`` distinguish users and list variants."""
+    attachments = db.session.query(db.func.max(TaskAttachment.id)).scalar_subquery()
+    tombstones = db.session.query(db.func.max(TaskTombstone.id)).scalar_subquery()
+    row = query.with_entities(
+        db.func.count(Task.id), db.func.max(Task.updated_at), attachments, tombstones,
+    ).one()
+    raw = '|'.join(str(v) for v in (*parts, today.isoformat(), *row))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def issue_token(today: date) -> str:
+    return f"{today.isoformat()}_{(datetime.utcnow() - TOKEN_SKEW).isoformat()}"
+
+
+def parse_token(raw: str, today: date) -> Optional[datetime]:
+    """Change timestamp for a token, or None when it is malformed, from another day or too old."""
+    day, sep, stamp = (raw or '').partition('_')
+    if not sep or day != today.isoformat():
+        return None
+    try:
+        since = datetime.fromisoformat(stamp)
+    except ValueError:
+        return None
+    if since < datetime.utcnow() - TOMBSTONE_RETENTION:
+        return None
+    return since
+
+
+def changes_since(
+    query, today: date, since: datetime, *, load: Callable = lambda q: q,
+) -> Tuple[List[Task], List[int]]:
+    """
+    Representative tasks changed after ``since`` and ids the client should drop.
+
+    A change to any occurrence of a recurrence group re-sends the group's current
+    representative, since adding or deleting an occurrence can move it. ``load`` adds
+    loader options to the query that fetches the changed tasks.
+    """
+    deleted = TaskTombstone.query.filter(TaskTombstone.deleted_at > since).all()
+    attached_ids = db.session.query(TaskAttachment.task_id).filter(TaskAttachment.created_at > since)
+    touched = db.session.query(Task.id, Task.recurrence_group_id).filter(
+        or_(Task.updated_at > since, Task.id.in_(attached_ids))
+    ).all()
+    touched_ids: Set[int] = {row.id for row in touched}
+    groups = {row.recurrence_group_id for row in touched if row.recurrence_group_id}
+    groups.update(t.recurrence_group_id for t in deleted if t.recurrence_group_id)
+    if groups:
+        touched_ids.update(
+            row[0] for row in db.session.query(Task.id).filter(Task.recurrence_group_id.in_(groups))
+        )
+    changed = []
+    if touched_ids:
+        changed = load(collapse_recurrences(query, today)).filter(Task.id.in_(touched_ids)).all()
+    kept = {t.id for t in changed}
+    removed = sorted({t.task_id for t in deleted} | (touched_ids - kept))
+    return changed, removed
@@ -0,0 +1,161 @@
+"""
+Per-assignee task statistics.
+
+``aggregate`` counts assigned, completed and overdue tasks for many users in one
+GROUP BY query. With ``rolling=True``, ``stats_for`` answers from ``TaskStats`` rows
+instead and only aggregates users whose row is missing, from an earlier day (overdue
+depends on the date) or older than ``max_age``, so dashboards cost O(users) rather
+than O(tasks). Rows it refreshes are written on a separate connection, so a read
+never commits the caller's session. Task write handlers call ``tasks_changed`` inside
+their transaction to refresh the rows of the affected assignees; callers are
+responsible for committing.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import and_, func
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from models import db, Task, TaskStats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_AGE = timedelta(hours=1)
+
+
+@dataclass(frozen=True)
+class TaskCounts:
+    assigned: int = 0
+    completed: int = 0
+    overdue: int = 0
+
+    @staticmethod
+    def _pct(part: int, whole: int) -> float:
+        return round(part / whole * 100, 1) if whole else 0
+
+    @property
+    def on_time_pct(self) -> float:
+        """Share of finished-or-due tasks that were completed."""
+        return self._pct(self.completed, self.completed + self.overdue)
+
+    @property
+    def completion_pct(self) -> float:
+        return self._pct(self.completed, self.assigned)
+
+    @property
+    def overdue_pct(self) -> float:
+        return self._pct(self.overdue, self.assigned)
+
+    def to_dict(self) -> dict:
+        return {
+            'assigned': self.assigned,
+            'completed': self.completed,
+            'overdue': self.overdue,
+            'on_time_pct': self.on_time_pct,
+        }
+
+
+def aggregate(user_ids: Iterable[int], today: date) -> Dict[int, TaskCounts]:
+    """Counts per assignee in one grouped query; users without tasks get zeros."""
+    ids = {uid for uid in user_ids if uid}
+    if not ids:
+        return {}
+    done = Task.status == 'done'
+    overdue = and_(Task.status != 'done', Task.due_date < today)
+    rows = (
+        db.session.query(
+            Task.assigned_to_id,
+            func.count(Task.id),
+            func.sum(db.case((done, 1), else_=0)),
+            func.sum(db.case((overdue, 1), else_=0)),
+        )
+        .filter(Task.assigned_to_id.in_(ids))
+        .group_by(Task.assigned_to_id)
+        .all()
+    )
+    counts = {uid: TaskCounts() for uid in ids}
+    for uid, assigned, completed, overdue_count in rows:
+        counts[uid] = TaskCounts(assigned, completed or 0, overdue_count or 0)
+    return counts
+
+
+def _row_values(counts: TaskCounts, today: date, now: datetime) -> dict:
+    return {
+        'assigned': counts.assigned,
+        'completed': counts.completed,
+        'overdue': counts.overdue,
+        'computed_on': today,
+        'refreshed_at': now,
+    }
+
+
+def _store(fresh: Dict[int, TaskCounts], seen: Dict[int, Optional[datetime]], today: date, now: datetime) -> None:
+    """Write refreshed rows in their own transaction, leaving the caller's session untouched."""
+    table = TaskStats.__table__
+    try:
+        with db.engine.begin() as conn:
+            for uid, counts in fresh.items():
+                values = _row_values(counts, today, now)
+                if uid not in seen:
+                    conn.execute(table.insert().values(user_id=uid, **values))
+                else:
+                    # Only replace the row we judged stale; a task write may have refreshed it meanwhile
+                    conn.execute(table.update().where(
+                        table.c.user_id == uid, table.c.refreshed_at == seen[uid],
+                    ).values(**values))
+    except IntegrityError:
+        # Another request seeded the same rows first; ours are equivalent
+        pass
+    except OperationalError:
+        # The caller's own transaction holds the write lock; the next read refreshes instead
+        logger.warning("Skipped refreshing task statistics for %s user(s)", len(fresh))
+
+
+def stats_for(
+    user_ids: Iterable[int],
+    today: Optional[date] = None,
+    *,
+    rolling: bool = False,
+    max_age: timedelta = DEFAULT_MAX_AGE,
+) -> Dict[int, TaskCounts]:
+    """Task counts per user, from the rolling table when ``rolling`` (never commits the session)."""
+    today = today or date.today()
+    ids = {uid for uid in user_ids if uid}
+    if not rolling or not ids:
+        return aggregate(ids, today)
+    now = datetime.utcnow()
+    # Autoflushing the caller's pending changes would take the write lock _store needs
+    with db.session.no_autoflush:
+        rows = {row.user_id: row for row in TaskStats.query.filter(TaskStats.user_id.in_(ids))}
+        counts: Dict[int, TaskCounts] = {}
+        stale = set()
+        for uid in ids:
+            row = rows.get(uid)
+            if row is None or row.computed_on != today or row.refreshed_at < now - max_age:
+                stale.add(uid)
+            else:
+                counts[uid] = TaskCounts(row.assigned, row.completed, row.overdue)
+        if not stale:
+            return counts
+        fresh = aggregate(stale, today)
+    counts.update(fresh)
+    _store(fresh, {uid: rows[uid].refreshed_at for uid in stale if uid in rows}, today, now)
+    return counts
+
+
+def tasks_changed(user_ids: Iterable[Optional[int]]) -> None:
+    """Refresh existing rolling rows for assignees whose tasks were added, changed or removed."""
+    ids = {uid for uid in user_ids if uid}
+    if not ids:
+        return
+    existing = [row[0] for row in db.session.query(TaskStats.user_id).filter(TaskStats.user_id.in_(ids))]
+    if not existing:
+        return
+    db.session.flush()
+    today, now = date.today(), datetime.utcnow()
+    for uid, counts in aggregate(existing, today).items():
+        TaskStats.query.filter(TaskStats.user_id == uid).update(
+            _row_values(counts, today, now), synchronize_session=False
+        )
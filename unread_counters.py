@@ -0,0 +1,244 @@
+"""
+Materialized unread counters for mail and chat.
+
+Each (user, channel) pair owns one ``UnreadCounter`` row so that unread polls are a
+primary-key lookup. Write handlers adjust counters inside their own transaction;
+callers are responsible for committing. A missing row is seeded with an exact
+recount the first time it is read or bumped; reads seed on a separate connection, so
+they never commit the caller's session. Chat recounts include archived messages,
+which stay unread until the read cursor passes them.
+"""
+import logging
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import and_, func
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from models import db, ChatMessage, ChatMessageArchive, ChatReadState, Mail, UnreadCounter
+
+logger = logging.getLogger(__name__)
+
+MAIL_CHANNEL = 'mail'
+GROUP_CHANNEL = 'chat:group'
+PRIVATE_PREFIX = 'chat:'
+
+
+def private_channel(peer_id: int) -> str:
+    return f"{PRIVATE_PREFIX}{peer_id}"
+
+
+def chat_channel(peer_id: Optional[int]) -> str:
+    return GROUP_CHANNEL if peer_id is None else private_channel(peer_id)
+
+
+def _counted_mail_filter():
+    return and_(Mail.is_read.is_(False), Mail.deleted_at.is_(None), Mail.is_draft.is_(False))
+
+
+def _store(user_id: int, channel: str, value: int) -> int:
+    row = db.session.get(UnreadCounter, (user_id, channel))
+    if row is None:
+        db.session.add(UnreadCounter(user_id=user_id, channel=channel, count=value))
+    else:
+        row.count = value
+    return value
+
+
+def _seed(user_id: int, counts: Dict[str, int]) -> None:
+    """Insert counters computed by a read in their own transaction, outside the caller's session."""
+    if not counts:
+        return
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(UnreadCounter.__table__.insert(), [
+                {'user_id': user_id, 'channel': channel, 'count': value} for channel, value in counts.items()
+            ])
+    except IntegrityError:
+        # A concurrent first read seeded them already
+        pass
+    except OperationalError:
+        # The caller's own transaction holds the write lock; the next read seeds instead
+        logger.warning("Skipped seeding %s unread counter(s) for user %s", len(counts), user_id)
+
+
+def _bump(user_id: int, channel: str, delta: int) -> bool:
+    """Atomically add delta to an existing counter; returns False when the row is missing."""
+    new_value = UnreadCounter.count + delta
+    updated = (
+        UnreadCounter.query.filter_by(user_id=user_id, channel=channel)
+        .update({UnreadCounter.count: db.case((new_value < 0, 0), else_=new_value)}, synchronize_session=False)
+    )
+    return bool(updated)
+
+
+# ----- mail -----
+
+def _count_mail(user_id: int) -> int:
+    return Mail.query.filter(Mail.recipient_id == user_id, _counted_mail_filter()).count()
+
+
+def recount_mail(user_id: int) -> int:
+    db.session.flush()
+    return _store(user_id, MAIL_CHANNEL, _count_mail(user_id))
+
+
+def mail_unread(user_id: int) -> int:
+    with db.session.no_autoflush:
+        row = db.session.get(UnreadCounter, (user_id, MAIL_CHANNEL))
+        if row is not None:
+            return row.count
+        value = _count_mail(user_id)
+    _seed(user_id, {MAIL_CHANNEL: value})
+    return value
+
+
+def bump_mail(user_id: int, delta: int = 1) -> None:
+    if not _bump(user_id, MAIL_CHANNEL, delta):
+        recount_mail(user_id)
+
+
+def mail_snapshot(mail_ids: Iterable[int]) -> Dict[int, int]:
+    """Count unread inbox mails per recipient among mail_ids (used to diff bulk changes)."""
+    ids = list(mail_ids)
+    if not ids:
+        return {}
+    db.session.flush()
+    rows = (
+        db.session.query(Mail.recipient_id, func.count(Mail.id))
+        .filter(Mail.id.in_(ids), _counted_mail_filter())
+        .group_by(Mail.recipient_id)
+        .all()
+    )
+    return {recipient_id: cnt for recipient_id, cnt in rows}
+
+
+def apply_mail_snapshot(before: Dict[int, int], after: Dict[int, int]) -> None:
+    for user_id in set(before) | set(after):
+        delta = after.get(user_id, 0) - before.get(user_id, 0)
+        if delta:
+            bump_mail(user_id, delta)
+
+
+# ----- chat -----
+
+def _all_messages():
+    """Hot and archived chat messages as one subquery (ids are unique across both)."""
+    hot, archived = (
+        db.select(model.id, model.sender_id, model.recipient_id) for model in (ChatMessage, ChatMessageArchive)
+    )
+    return hot.union_all(archived).subquery('messages')
+
+
+def _count_chat(user_id: int, peer_id: Optional[int]) -> int:
+    state = ChatReadState.query.filter_by(user_id=user_id, peer_id=peer_id).first()
+    last_read = state.last_read_id if state else 0
+    messages = _all_messages()
+    q = db.select(func.count()).select_from(messages).where(messages.c.id > last_read)
+    if peer_id is None:
+        q = q.where(messages.c.recipient_id.is_(None), messages.c.sender_id != user_id)
+    else:
+        q = q.where(messages.c.sender_id == peer_id, messages.c.recipient_id == user_id)
+    return db.session.scalar(q)
+
+
+def recount_chat(user_id: int, peer_id: Optional[int]) -> int:
+    db.session.flush()
+    return _store(user_id, chat_channel(peer_id), _count_chat(user_id, peer_id))
+
+
+def _count_all_chat(user_id: int) -> Dict[str, int]:
+    """Every chat counter for a user, with one grouped query per conversation kind."""
+    counts = {GROUP_CHANNEL: _count_chat(user_id, None)}
+    read_state = db.aliased(ChatReadState)
+    messages = _all_messages()
+    rows = (
+        db.session.query(messages.c.sender_id, func.count(messages.c.id))
+        .select_from(messages)
+        .outerjoin(
+            read_state,
+            and_(read_state.user_id == user_id, read_state.peer_id == messages.c.sender_id),
+        )
+        .filter(
+            messages.c.recipient_id == user_id,
+            messages.c.id > func.coalesce(read_state.last_read_id, 0),
+        )
+        .group_by(messages.c.sender_id)
+        .all()
+    )
+    counts.update((private_channel(sender_id), cnt) for sender_id, cnt in rows)
+    return counts
+
+
+def chat_unread(user_id: int) -> dict:
+    with db.session.no_autoflush:
+        counts = {
+            row.channel: row.count
+            for row in UnreadCounter.query.filter(
+                UnreadCounter.user_id == user_id,
+                UnreadCounter.channel.like(f"{PRIVATE_PREFIX}%"),
+            )
+        }
+        if GROUP_CHANNEL not in counts:
+            fresh = _count_all_chat(user_id)
+            _seed(user_id, {channel: value for channel, value in fresh.items() if channel not in counts})
+            counts = fresh
+    privates = {
+        int(channel[len(PRIVATE_PREFIX):]): value
+        for channel, value in counts.items()
+        if channel != GROUP_CHANNEL and value
+    }
+    return {'group': counts[GROUP_CHANNEL], 'privates': privates}
+
+
+def chat_message_added(msg: ChatMessage) -> None:
+    if msg.recipient_id is None:
+        new_value = UnreadCounter.count + 1
+        UnreadCounter.query.filter(
+            UnreadCounter.channel == GROUP_CHANNEL,
+            UnreadCounter.user_id != msg.sender_id,
+        ).update({UnreadCounter.count: new_value}, synchronize_session=False)
+        return
+    if not _bump(msg.recipient_id, private_channel(msg.sender_id), 1):
+        recount_chat(msg.recipient_id, msg.sender_id)
+
+
+def chat_message_removed(msg: ChatMessage) -> None:
+    """Undo the unread contribution of a message that is about to be deleted."""
+    if msg.recipient_id is None:
+        readers = db.session.query(ChatReadState.user_id).filter(
+            ChatReadState.peer_id.is_(None),
+            ChatReadState.last_read_id >= msg.id,
+        )
+        UnreadCounter.query.filter(
+            UnreadCounter.channel == GROUP_CHANNEL,
+            UnreadCounter.user_id != msg.sender_id,
+            UnreadCounter.count > 0,
+            ~UnreadCounter.user_id.in_(readers),
+        ).update({UnreadCounter.count: UnreadCounter.count - 1}, synchronize_session=False)
+        return
+    state = ChatReadState.query.filter_by(user_id=msg.recipient_id, peer_id=msg.sender_id).first()
+    if not state or state.last_read_id < msg.id:
+        _bump(msg.recipient_id, private_channel(msg.sender_id), -1)
+
+
+def chat_sender_removed(sender_id: int) -> None:
+    """Undo the group unread contribution of every message (hot or archived) from a sender about to be deleted."""
+    last_read = (
+        db.select(func.coalesce(func.max(ChatReadState.last_read_id), 0))
+        .where(ChatReadState.user_id == UnreadCounter.user_id, ChatReadState.peer_id.is_(None))
+        .correlate(UnreadCounter)
+        .scalar_subquery()
+    )
+    messages = _all_messages()
+    unread = (
+        db.select(func.count(messages.c.id))
+        .where(messages.c.sender_id == sender_id, messages.c.recipient_id.is_(None), messages.c.id > last_read)
+        .correlate(UnreadCounter)
+        .scalar_subquery()
+    )
+    new_value = UnreadCounter.count - unread
+    UnreadCounter.query.filter(
+        UnreadCounter.channel == GROUP_CHANNEL,
+        UnreadCounter.user_id != sender_id,
+        UnreadCounter.count > 0,
+    ).update({UnreadCounter.count: db.case((new_value < 0, 0), else_=new_value)}, synchronize_session=False)
@@ -0,0 +1,52 @@
+"""
+Process-wide cache of user rows for the authenticated hot path.
+
+``get_user`` answers from a cached copy younger than the TTL without a SELECT. The
+copy is detached and merged into the current session with ``load=False``, so callers
+get an ordinary session-attached ``User`` they can modify and commit. Writers call
+``invalidate`` after committing a change to a user row; the TTL bounds how long
+writes made by other processes stay invisible.
+"""
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from models import db, User
+
+DEFAULT_TTL = 30.0
+
+_entries: Dict[int, Tuple[float, User]] = {}
+_lock = threading.Lock()
+
+
+def _detached_copy(user: User) -> User:
+    copy = User(**{attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs})
+    make_transient_to_detached(copy)
+    return copy
+
+
+def get_user(user_id: int, ttl: float = DEFAULT_TTL) -> Optional[User]:
+    """The user with ``user_id`` attached to the current session, or None when it does not exist."""
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(user_id)
+    if entry is not None and now - entry[0] < ttl:
+        # An instance already in this session may carry pending changes; never overwrite it
+        present = db.session.identity_map.get(db.session.identity_key(User, user_id))
+        return present if present is not None else db.session.merge(entry[1], load=False)
+    user = db.session.get(User, user_id)
+    if user is not None and user not in db.session.dirty:
+        with _lock:
+            _entries[user_id] = (now, _detached_copy(user))
+    return user
+
+
+def invalidate(user_id: Optional[int] = None) -> None:
+    """Forget one cached user, or all of them (call after committing a write)."""
+    with _lock:
+        if user_id is None:
+            _entries.clear()
+        else:
+            _entries.pop(user_id, None)
@@ -0,0 +1,89 @@
+"""
+Account deletion.
+
+``delete_user`` removes a user and every row that depends on it with set-based
+statements inside the caller's transaction; nothing is loaded per task, message or
+attachment. Tasks the user is assigned to or created go (with their attachments and
+feed tombstones), as do the user's mails, chat messages (hot and archived), read
+states, node assignments, unread counters and task statistics. References that
+outlive the user (attachments they uploaded to other tasks, nodes they research) are
+nulled out. Upload files left without an owner are queued for ``file_reclaim``.
+Callers are responsible for committing.
+"""
+import json
+from typing import Dict, List
+
+from sqlalchemy import or_
+
+import file_reclaim
+import task_feed
+import task_stats
+import unread_counters
+from models import (
+    db, ChatMessage, ChatMessageArchive, ChatReadState, Mail, ProjectNode, ProjectNodeAssignee, Task,
+    TaskAttachment, TaskStats, UnreadCounter, User,
+)
+
+
+def profile_file_paths(user: User) -> List[str]:
+    """Stored paths of a user's resume, avatar and profile uploads."""
+    paths = [user.resume_path, user.avatar_path]
+    try:
+        entries = json.loads(user.profile_files or '{}')
+    except (TypeError, ValueError):
+        entries = {}
+    if isinstance(entries, dict):
+        paths.extend(entry.get('stored_path') for entry in entries.values() if isinstance(entry, dict))
+    return [p for p in paths if p]
+
+
+def _delete(query) -> int:
+    return query.delete(synchronize_session=False)
+
+
+def delete_user(user: User) -> Dict[str, int]:
+    """Delete ``user`` and its dependent rows; returns the number of rows removed per kind."""
+    uid = user.id
+    owned_tasks = or_(Task.assigned_to_id == uid, Task.created_by_id == uid)
+    task_ids = db.select(Task.id).where(owned_tasks)
+
+    task_feed.record_deleted_where(owned_tasks)
+    file_reclaim.enqueue_from(db.select(TaskAttachment.stored_path).where(
+        TaskAttachment.task_id.in_(task_ids), TaskAttachment.stored_path.isnot(None),
+    ))
+    file_reclaim.enqueue(profile_file_paths(user))
+    removed = {'attachments': _delete(TaskAttachment.query.filter(TaskAttachment.task_id.in_(task_ids)))}
+    TaskAttachment.query.filter(TaskAttachment.uploaded_by_id == uid).update(
+        {TaskAttachment.uploaded_by_id: None}, synchronize_session=False
+    )
+    # Other assignees lose the tasks this user created
+    assignees = [row[0] for row in db.session.query(Task.assigned_to_id).filter(owned_tasks).distinct()]
+    removed['tasks'] = _delete(Task.query.filter(owned_tasks))
+    _delete(TaskStats.query.filter(TaskStats.user_id == uid))
+    task_stats.tasks_changed(a for a in assignees if a != uid)
+
+    # Recipients lose the unread mails this user sent; applied after the delete so a seeded counter is exact
+    sent_ids = [row[0] for row in db.session.query(Mail.id).filter(Mail.sender_id == uid)]
+    unread_before = unread_counters.mail_snapshot(sent_ids)
+    removed['mails'] = _delete(Mail.query.filter(or_(Mail.sender_id == uid, Mail.recipient_id == uid)))
+    unread_counters.apply_mail_snapshot(unread_before, {})
+
+    # Private counters for this user's conversations are dropped below; group ones are adjusted here
+    unread_counters.chat_sender_removed(uid)
+    removed['chat_messages'] = _delete(
+        ChatMessage.query.filter(or_(ChatMessage.sender_id == uid, ChatMessage.recipient_id == uid))
+    ) + _delete(
+        ChatMessageArchive.query.filter(or_(ChatMessageArchive.sender_id == uid, ChatMessageArchive.recipient_id == uid))
+    )
+    _delete(ChatReadState.query.filter(or_(ChatReadState.user_id == uid, ChatReadState.peer_id == uid)))
+    _delete(UnreadCounter.query.filter(
+        or_(UnreadCounter.user_id == uid, UnreadCounter.channel == unread_counters.private_channel(uid))
+    ))
+
+    _delete(ProjectNodeAssignee.query.filter(ProjectNodeAssignee.user_id == uid))
+    ProjectNode.query.filter(ProjectNode.researcher_id == uid).update(
+        {ProjectNode.researcher_id: None}, synchronize_session=False
+    )
+    _delete(User.query.filter(User.id == uid))
+    db.session.expunge(user)
+    return removed
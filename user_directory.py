@@ -0,0 +1,79 @@
+"""
+Cached user directory for rosters and recipient pickers.
+
+``snapshot`` returns an immutable, pre-sorted view of every user: card order (role
+priority, then display name), username order and the assignee dicts (in card order)
+the dashboards embed as JSON. It is rebuilt with one query only after ``invalidate``
+(call it after committing a user create, edit or delete) or once it is older than
+``max_age`` seconds, which bounds how long writes made by other processes stay
+invisible.
+"""
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from models import db, User
+from versioned_snapshot import VersionedSnapshot
+
+ROLE_DISPLAY_ORDER = {'admin': 0, 'supervisor': 1, 'researcher': 2}
+
+_COLUMNS = (
+    User.id, User.username, User.full_name, User.email, User.phone_number, User.role,
+    User.responsibility, User.avatar_path, User.is_active,
+)
+
+
+@dataclass(frozen=True)
+class DirectoryUser:
+    """The user fields pages render; attribute names match ``User`` so templates take either."""
+    id: int
+    username: str
+    full_name: Optional[str]
+    email: str
+    phone_number: Optional[str]
+    role: str
+    responsibility: Optional[str]
+    avatar_path: Optional[str]
+    is_active: bool
+
+    @property
+    def display_name(self) -> str:
+        return self.full_name or self.username or self.email or ''
+
+
+@dataclass(frozen=True)
+class Directory:
+    cards: Tuple[DirectoryUser, ...]
+    by_username: Tuple[DirectoryUser, ...]
+    assignees: Tuple[dict, ...]
+
+    def others(self, user_id: int) -> List[DirectoryUser]:
+        """Users in username order, without ``user_id``."""
+        return [u for u in self.by_username if u.id != user_id]
+
+
+def _card_key(user: DirectoryUser):
+    return (ROLE_DISPLAY_ORDER.get(user.role, len(ROLE_DISPLAY_ORDER)), user.display_name.lower())
+
+
+def _build() -> Directory:
+    users = tuple(DirectoryUser(*row) for row in db.session.query(*_COLUMNS).order_by(User.username))
+    cards = tuple(sorted(users, key=_card_key))
+    return Directory(
+        cards=cards,
+        by_username=users,
+        assignees=tuple(
+            {'id': u.id, 'username': u.username, 'full_name': u.full_name, 'role': u.role} for u in cards
+        ),
+    )
+
+
+_snapshot = VersionedSnapshot(_build)
+
+
+def invalidate() -> None:
+    _snapshot.invalidate()
+
+
+def snapshot(max_age: float) -> Directory:
+    """Current directory, rebuilt from the database only when stale."""
+    return _snapshot.get(max_age)
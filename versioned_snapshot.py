@@ -0,0 +1,39 @@
+"""
+Process-local cache for a value rebuilt from the database on demand.
+
+``VersionedSnapshot`` keeps the last built value with the version it was built at.
+``invalidate`` bumps the version (call it after committing a change the value
+reflects); ``get`` rebuilds only when the version moved or the value is older than
+``max_age`` seconds, which bounds how long writes made by other processes stay
+invisible.
+"""
+import threading
+import time
+from typing import Callable, Generic, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+class VersionedSnapshot(Generic[T]):
+    def __init__(self, build: Callable[[], T]):
+        self._build = build
+        self._version = 0
+        self._cached: Optional[Tuple[int, float, T]] = None
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version += 1
+
+    def get(self, max_age: float) -> T:
+        """Current value, rebuilt only when stale."""
+        with self._lock:
+            cached, version = self._cached, self._version
+        if cached is not None and cached[0] == version and time.monotonic() - cached[1] < max_age:
+            return cached[2]
+        value = self._build()
+        with self._lock:
+            # An invalidate() during the build leaves the version ahead, forcing another rebuild
+            if self._version == version:
+                self._cached = (version, time.monotonic(), value)
+        return value